@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from .cache import connect_table_versions
+        from .images import connect_image_variants
+        from .metrics import connect_query_timer
+        connect_table_versions()
+        connect_image_variants()
+        connect_query_timer()
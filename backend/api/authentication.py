@@ -0,0 +1,100 @@
+import threading
+from datetime import datetime, timezone
+
+from api.cache import bump_table_version, table_version
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from users.models import RevokedToken, User
+
+CLAIMS = ('is_active', 'is_staff', 'is_superuser')
+
+
+def token_for(user):
+    """Refresh token of the user carrying the flags permissions check."""
+
+    refresh = RefreshToken.for_user(user)
+    for claim in CLAIMS:
+        refresh[claim] = getattr(user, claim)
+    return refresh
+
+
+class Denylist:
+    """Process-local set of revoked token ids.
+
+    Reloaded from the revoked tokens table once its version moves, so
+    checking a token costs one cache read.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.jtis = frozenset()
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        version = table_version('revoked-tokens')
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.jtis = frozenset(RevokedToken.objects.using(
+                    DEFAULT_DB_ALIAS
+                ).filter(
+                    expires_at__gt=datetime.now(timezone.utc)
+                ).values_list('jti', flat=True))
+                self.version = version
+
+    def is_revoked(self, token):
+        self.refresh()
+        return token[api_settings.JTI_CLAIM] in self.jtis
+
+    def revoke(self, token):
+        """Deny the token until it expires, False if it already was."""
+
+        now = datetime.now(timezone.utc)
+        RevokedToken.objects.filter(expires_at__lte=now).delete()
+        _, created = RevokedToken.objects.get_or_create(
+            jti=token[api_settings.JTI_CLAIM],
+            defaults={'expires_at': datetime.fromtimestamp(
+                token['exp'], timezone.utc
+            )}
+        )
+        bump_table_version('revoked-tokens')
+        return created
+
+
+denylist = Denylist()
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Bearer token authentication without database queries.
+
+    The user is built from the token claims, its other fields are
+    deferred and loaded by a single query on first access.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if denylist.is_revoked(token):
+            raise InvalidToken('Token is revoked.')
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            values = {
+                api_settings.USER_ID_FIELD:
+                    validated_token[api_settings.USER_ID_CLAIM],
+                **{claim: validated_token[claim] for claim in CLAIMS},
+            }
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user.')
+        user = User.from_db(DEFAULT_DB_ALIAS, list(values), [
+            values[field.attname] for field in User._meta.concrete_fields
+            if field.attname in values
+        ])
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive.')
+        return user
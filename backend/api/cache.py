@@ -0,0 +1,99 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from foodgram.settings import MEMBERSHIP_CACHE_TTL
+from recipes.models import (FavoriteRecipe, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import User
+
+MEMBERSHIP_MODELS = {
+    'favorite': FavoriteRecipe,
+    'shopping': ShoppingCart,
+}
+
+VERSIONED_MODELS = (
+    (Tag, ('tags', 'recipes')),
+    (Ingredient, ('ingredients', 'recipes')),
+    (Recipe, ('recipes',)),
+    (RecipeIngredient, ('recipes',)),
+    (User, ('recipes',)),
+    (Follow, ('recipes',)),
+)
+
+
+def get_stamp(key):
+    """Version stamp stored under the key.
+
+    A missing stamp starts from the clock, so anything cached under a
+    lost stamp can never be read again.
+    """
+
+    version = cache.get(key)
+    if version is not None:
+        return version
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def table_version(table):
+    """Version stamp of the table, in nanoseconds of the last write."""
+
+    return get_stamp(f'table-version:{table}')
+
+
+def bump_table_version(*tables):
+    """Mark tables as changed once the current transaction commits.
+
+    A stamp moved earlier would let a concurrent read tag the old rows
+    with the new version, and a rolled back write must not move it.
+    """
+
+    transaction.on_commit(lambda: cache.set_many(
+        {f'table-version:{table}': time.time_ns() for table in tables},
+        timeout=None
+    ))
+
+
+def connect_table_versions():
+    """Bump table versions on every write of the versioned models."""
+
+    for model, tables in VERSIONED_MODELS:
+        def bump(tables=tables, update_fields=None, **kwargs):
+            if update_fields != frozenset(('last_login',)):
+                bump_table_version(*tables)
+
+        post_save.connect(bump, sender=model, weak=False)
+        post_delete.connect(bump, sender=model, weak=False)
+    m2m_changed.connect(
+        lambda **kwargs: bump_table_version('recipes'),
+        sender=Recipe.tags.through, weak=False
+    )
+
+
+def membership_version(user_id):
+    """Current favorite and cart version of the user."""
+
+    return get_stamp(f'membership:{user_id}:version')
+
+
+def invalidate_membership(user_id):
+    """Drop cached favorite and cart sets of the user."""
+
+    cache.set(f'membership:{user_id}:version', time.time_ns(), timeout=None)
+
+
+def get_recipe_ids(user, kind):
+    """Recipe ids the user added to favorites or shopping cart."""
+
+    key = f'membership:{user.id}:{kind}:{membership_version(user.id)}'
+    recipe_ids = cache.get(key)
+    if recipe_ids is None:
+        recipe_ids = frozenset(
+            MEMBERSHIP_MODELS[kind].objects.filter(
+                user=user
+            ).values_list('recipe_id', flat=True)
+        )
+        cache.set(key, recipe_ids, MEMBERSHIP_CACHE_TTL)
+    return recipe_ids
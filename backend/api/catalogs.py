@@ -0,0 +1,99 @@
+import gzip
+import re
+
+from api.cache import table_version
+from api.serializers import IngredientSerializer, TagSerializer
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from foodgram.settings import CATALOG_CACHE_TTL
+from recipes.models import Ingredient, Tag
+from rest_framework.renderers import JSONRenderer
+
+CATALOGS = {
+    'tags': (Tag, TagSerializer),
+    'ingredients': (Ingredient, IngredientSerializer),
+}
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+rendered_catalogs = {}
+
+
+def catalog_objects(name):
+    """Catalog rows, read from the primary.
+
+    A lagging replica would leave the old rows cached under the new
+    version until the next write.
+    """
+
+    return CATALOGS[name][0].objects.using(DEFAULT_DB_ALIAS).all()
+
+
+def cached_catalog(name, version):
+    rendered = rendered_catalogs.get(name)
+    if rendered is None or rendered[0] != version:
+        rendered = cache.get(f'catalog:{name}:{version}')
+    if rendered is not None:
+        rendered_catalogs[name] = rendered
+    return rendered
+
+
+def store_catalog(name, version, objects):
+    body = JSONRenderer().render(CATALOGS[name][1](objects, many=True).data)
+    rendered = (version, body, gzip.compress(body, mtime=0))
+    cache.set(f'catalog:{name}:{version}', rendered, CATALOG_CACHE_TTL)
+    rendered_catalogs[name] = rendered
+    return rendered
+
+
+def render_catalog(name):
+    """JSON and gzip bytes of the catalog for its current version."""
+
+    version = table_version(name)
+    rendered = cached_catalog(name, version)
+    if rendered is not None:
+        return rendered
+    return store_catalog(name, version, catalog_objects(name))
+
+
+async def arender_catalog(name):
+    """Async render_catalog, reading a missing catalog with aiterator."""
+
+    version = table_version(name)
+    rendered = cached_catalog(name, version)
+    if rendered is not None:
+        return rendered
+    return store_catalog(name, version, [
+        obj async for obj in catalog_objects(name).aiterator()
+    ])
+
+
+def warm_catalogs():
+    """Render every catalog ahead of the first request."""
+
+    for name in CATALOGS:
+        render_catalog(name)
+
+
+def respond_catalog(rendered, request):
+    version, body, compressed = rendered
+    if ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        response = HttpResponse(compressed, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def catalog_response(name, request):
+    """Response with the pre-rendered catalog, gzipped when accepted."""
+
+    return respond_catalog(render_catalog(name), request)
+
+
+async def acatalog_response(name, request):
+    """Async catalog_response."""
+
+    return respond_catalog(await arender_catalog(name), request)
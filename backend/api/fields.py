@@ -0,0 +1,11 @@
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+
+class Base64OrFileImageField(Base64ImageField):
+    """Image field accepting base64 strings and multipart file uploads."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            return super().to_internal_value(data)
+        return serializers.ImageField.to_internal_value(self, data)
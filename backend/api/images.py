@@ -0,0 +1,104 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from api.cache import bump_table_version
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+from foodgram.settings import (IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_WIDTHS,
+                               IMAGE_WORKERS)
+from PIL import Image
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = None
+
+
+def variant_name(name, width, image_format):
+    """Storage name of the resized image variant."""
+
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'recipes/variants/{stem}-{width}.{image_format}'
+
+
+def variant_urls(name, variants):
+    """URLs of the recorded variants keyed by format and width."""
+
+    return {
+        image_format: {
+            width: default_storage.url(variant_name(name, width, image_format))
+            for width in widths
+        }
+        for image_format, widths in variants.items()
+    }
+
+
+def make_variants(name):
+    """Write missing resized variants of the stored image.
+
+    The variants are recorded on the recipes using the image, so
+    responses list them without looking them up in the storage.
+    """
+
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(name) as file:
+        original = Image.open(file)
+        original.load()
+    original = original.convert('RGB')
+    for width in IMAGE_VARIANT_WIDTHS:
+        resized = original.copy()
+        resized.thumbnail((width, width * original.height // original.width))
+        for image_format in IMAGE_VARIANT_FORMATS:
+            target = variant_name(name, width, image_format)
+            if default_storage.exists(target):
+                continue
+            buffer = io.BytesIO()
+            resized.save(buffer, format=image_format.upper())
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+    Recipe.objects.filter(image=name).update(image_variants={
+        image_format: list(IMAGE_VARIANT_WIDTHS)
+        for image_format in IMAGE_VARIANT_FORMATS
+    })
+    bump_table_version('recipes')
+
+
+def run_variants(name):
+    close_old_connections()
+    try:
+        make_variants(name)
+    except Exception:
+        logger.exception('Image variants of %s failed.', name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(name):
+    """Make variants in the process worker pool."""
+
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=IMAGE_WORKERS, thread_name_prefix='image-variants'
+        )
+    executor.submit(run_variants, name)
+
+
+def connect_image_variants():
+    """Make variants of new recipe images once the write is committed.
+
+    Saving a recipe forgets the variants of a replaced image, so saves
+    keeping the image and its recorded variants schedule nothing.
+    """
+
+    def on_recipe_save(instance, update_fields=None, **kwargs):
+        if instance.image and not instance.image_variants and (
+            update_fields is None or 'image' in update_fields
+        ):
+            name = instance.image.name
+            transaction.on_commit(lambda: schedule_variants(name))
+
+    post_save.connect(on_recipe_save, sender=Recipe, weak=False)
@@ -0,0 +1,99 @@
+import bisect
+import threading
+
+from api.cache import table_version
+from django.db import DEFAULT_DB_ALIAS
+from recipes.models import Ingredient
+from recipes.search import normalize
+
+EXACT, PREFIX, WORD_START = range(3)
+MAX_CHAR = chr(0x10FFFF)
+
+
+def word_starts(name):
+    """Offsets of every word of the name."""
+
+    return [0] + [
+        position for position in range(1, len(name))
+        if name[position].isalnum() and not name[position - 1].isalnum()
+    ]
+
+
+class IngredientPrefixIndex:
+    """Process-local sorted index of ingredient names.
+
+    Every word of a casefolded name is stored with the rest of the name,
+    so both name and word prefixes are found with two binary searches.
+    The index is rebuilt lazily once the ingredients table version moves.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.keys = []
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def rows(self):
+        # From the primary, a lagging replica would be indexed as current.
+        return Ingredient.objects.using(DEFAULT_DB_ALIAS).values(
+            'id', 'name', 'measurement_unit'
+        )
+
+    def build(self, rows):
+        entries = []
+        for row in rows:
+            name = normalize(row['name'])
+            for start in word_starts(name):
+                kind = WORD_START if start else PREFIX
+                entries.append((name[start:], kind, name, row))
+        entries.sort(key=lambda entry: entry[0])
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def refresh(self):
+        version = table_version('ingredients')
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.build(self.rows())
+                self.version = version
+
+    async def arefresh(self):
+        version = table_version('ingredients')
+        if version == self.version:
+            return
+        rows = [row async for row in self.rows().aiterator()]
+        with self.lock:
+            if version != self.version:
+                self.build(rows)
+                self.version = version
+
+    def search(self, query, limit=None):
+        """Ingredients matching the query, exact and name-start hits first."""
+
+        self.refresh()
+        return self.match(query, limit)
+
+    async def asearch(self, query, limit=None):
+        """Async search, rebuilding a stale index with aiterator."""
+
+        await self.arefresh()
+        return self.match(query, limit)
+
+    def match(self, query, limit):
+        query = normalize(query).strip()
+        start = bisect.bisect_left(self.keys, query)
+        end = bisect.bisect_right(self.keys, query + MAX_CHAR, lo=start)
+        found = {}
+        for key, kind, name, row in self.entries[start:end]:
+            if kind == PREFIX and key == query:
+                kind = EXACT
+            best = found.get(row['id'])
+            if best is None or kind < best[0]:
+                found[row['id']] = (kind, name, row)
+        ranked = sorted(found.values(), key=lambda match: match[:2])
+        return [row for kind, name, row in ranked[:limit]]
+
+
+ingredient_index = IngredientPrefixIndex()
@@ -0,0 +1,450 @@
+import base64
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from api import images
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from foodgram.settings import BASE_DIR
+from PIL import Image
+from recipes.models import Follow, Ingredient, Recipe, RecipeIngredient, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+DEFAULT_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+MEMORY_SAMPLES = 3
+PASSWORD = 'synthetic-password'
+
+
+class DeferredExecutor:
+    """Image variant pool running its jobs once the requests are measured.
+
+    Jobs running alongside the measured requests would skew them, and the
+    in-memory SQLite test database locks tables against their writes.
+    """
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, function, *args):
+        self.jobs.append((function, args))
+
+    def shutdown(self, wait=True):
+        for function, args in self.jobs:
+            function(*args)
+        self.jobs = []
+
+
+def percentile(timings, share):
+    """Percentile of timings, inclusive of the extremes."""
+
+    if len(timings) < 2:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[share - 1]
+
+
+def image_data():
+    content = io.BytesIO()
+    Image.new('RGB', (32, 32), (73, 182, 78)).save(content, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(content.getvalue()).decode()
+    )
+
+
+class Command(BaseCommand):
+    """Benchmark API endpoints."""
+
+    help = (
+        'Drive every API route through the test client on a seeded test '
+        'database, report latency percentiles, queries and memory per '
+        'request and compare them against the baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=200,
+            help='Users of the seeded dataset.'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=2000,
+            help='Recipes of the seeded dataset.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of the dataset.'
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help='Measured requests per scenario.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Unmeasured requests per scenario.'
+        )
+        parser.add_argument(
+            '--only', nargs='+', default=None,
+            help='Run only scenarios with these name prefixes.'
+        )
+        parser.add_argument(
+            '--baseline', default=DEFAULT_BASELINE,
+            help='Baseline json file.'
+        )
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Write the results as the new baseline.'
+        )
+        parser.add_argument(
+            '--latency-threshold', type=float, default=0.5,
+            help='Allowed relative p95 latency growth.'
+        )
+        parser.add_argument(
+            '--latency-floor', type=float, default=2,
+            help='Latency growth in ms that is never a regression.'
+        )
+        parser.add_argument(
+            '--memory-threshold', type=float, default=0.25,
+            help='Allowed relative memory growth.'
+        )
+        parser.add_argument(
+            '--query-threshold', type=int, default=0,
+            help='Allowed extra queries per request.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity=0, interactive=False, serialized_aliases=()
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(
+                CACHES=BENCHMARK_CACHES, MEDIA_ROOT=media
+            ):
+                images.executor = DeferredExecutor()
+                try:
+                    results = self.run()
+                    images.executor.shutdown(wait=True)
+                finally:
+                    images.executor = None
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        if options['save']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+                file.write('\n')
+            self.stdout.write(f'Baseline saved to {options["baseline"]}.')
+            return
+        self.compare(results)
+
+    def run(self):
+        options = self.options
+        call_command(
+            'generate_dataset', users=options['users'],
+            recipes=options['recipes'], seed=options['seed'],
+            stdout=io.StringIO()
+        )
+        results = {}
+        self.stdout.write(
+            f'{"scenario":<40}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+            f'{"queries":>9}{"KiB":>9}'
+        )
+        for name, request in self.scenarios():
+            if options['only'] and not name.startswith(tuple(
+                options['only']
+            )):
+                continue
+            results[name] = self.measure(name, request)
+            result = results[name]
+            self.stdout.write(
+                f'{name:<40}{result["p50"]:>9.2f}{result["p95"]:>9.2f}'
+                f'{result["p99"]:>9.2f}{result["queries"]:>9}'
+                f'{result["memory"]:>9.0f}'
+            )
+        return results
+
+    def measure(self, name, request):
+        """Latency, query count and peak memory of the scenario."""
+
+        for number in range(self.options['warmup']):
+            self.check_response(name, request(number))
+        timings = []
+        queries = 0
+        offset = self.options['warmup']
+        for number in range(offset, offset + self.options['iterations']):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = request(number)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.check_response(name, response)
+            queries = max(queries, len(context.captured_queries))
+        offset += self.options['iterations']
+        peaks = []
+        for number in range(offset, offset + MEMORY_SAMPLES):
+            tracemalloc.start()
+            response = request(number)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+        return {
+            'p50': round(percentile(timings, 50), 2),
+            'p95': round(percentile(timings, 95), 2),
+            'p99': round(percentile(timings, 99), 2),
+            'queries': queries,
+            'memory': round(statistics.median(peaks)),
+        }
+
+    def check_response(self, name, response):
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{name}: unexpected status {response.status_code}.'
+            )
+
+    def client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def scenarios(self):
+        """Named request callables, each taking the iteration number."""
+
+        reader = User.objects.filter(
+            id__in=Follow.objects.values('user')
+        ).order_by('id').first()
+        author = User.objects.order_by('-recipes_count', 'id').first()
+        recipe_ids = list(Recipe.objects.order_by('id').values_list(
+            'id', flat=True
+        ))
+        tag = Tag.objects.order_by('id').first()
+        ingredients = list(Ingredient.objects.order_by('id')[:5])
+        client = self.client(reader)
+        anonymous = self.client()
+        payload = {
+            'name': 'Benchmark recipe',
+            'text': 'Benchmark recipe text',
+            'cooking_time': 10,
+            'image': image_data(),
+            'tags': [tag.id],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in ingredients
+            ],
+        }
+        own = client.post('/api/recipes/', payload, format='json').data['id']
+        word = ingredients[0].name.split()[0]
+        needed = (
+            self.options['iterations'] + self.options['warmup']
+            + MEMORY_SAMPLES
+        )
+        others = list(Recipe.objects.exclude(
+            favorite__user=reader
+        ).exclude(
+            shopping__user=reader
+        ).order_by('id').values_list('id', flat=True)[:needed])
+        authors = list(User.objects.exclude(
+            author__user=reader
+        ).exclude(id=reader.id).order_by('id').values_list(
+            'id', flat=True
+        )[:needed])
+        if min(len(others), len(authors)) < needed:
+            raise CommandError('Dataset is too small for the iterations.')
+        image = Recipe.objects.get(id=own).image.name
+        disposable = []
+        for number in range(needed):
+            recipe = Recipe.objects.create(
+                author=reader, name=f'Disposable recipe {number}',
+                text='Benchmark recipe text', cooking_time=10, image=image
+            )
+            recipe.tags.add(tag)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in ingredients
+            )
+            disposable.append(recipe.id)
+        tokens = [
+            f'Token {Token.objects.get_or_create(user_id=user_id)[0].key}'
+            for user_id in authors
+        ]
+        staff = self.client(User.objects.create_user(
+            username='benchmark-staff', email='staff@benchmark.test',
+            password=PASSWORD, first_name='Staff', last_name='Benchmark',
+            is_staff=True
+        ))
+
+        def get(url, user_client=client, **params):
+            return lambda number: user_client.get(url, params)
+
+        def at(url, items, user_client=client, method='post'):
+            return lambda number: getattr(user_client, method)(
+                url.format(items[number % len(items)])
+            )
+
+        lists = {
+            'all': {},
+            'tags': {'tags': tag.slug},
+            'author': {'author': author.id},
+            'author+tags': {'author': author.id, 'tags': tag.slug},
+            'favorited': {'is_favorited': 1},
+            'favorited+tags': {'is_favorited': 1, 'tags': tag.slug},
+            'in_cart': {'is_in_shopping_cart': 1},
+            'in_cart+tags': {'is_in_shopping_cart': 1, 'tags': tag.slug},
+            'search': {'search': word},
+            'search+tags': {'search': word, 'tags': tag.slug},
+            'cursor': {'cursor': ''},
+            'page': {'page': 3},
+        }
+        scenarios = [
+            (f'recipes.list[{name}]', get('/api/recipes/', **params))
+            for name, params in lists.items()
+        ]
+        scenarios += [
+            ('recipes.list[anonymous]', get('/api/recipes/', anonymous)),
+            ('recipes.feed', get('/api/recipes/feed/')),
+            ('recipes.retrieve', at(
+                '/api/recipes/{}/', recipe_ids, method='get'
+            )),
+            ('recipes.create', lambda number: client.post(
+                '/api/recipes/', payload, format='json'
+            )),
+            ('recipes.update', lambda number: client.patch(
+                f'/api/recipes/{own}/',
+                dict(payload, cooking_time=number % 100 + 1), format='json'
+            )),
+            ('recipes.destroy', at(
+                '/api/recipes/{}/', disposable, method='delete'
+            )),
+            ('recipes.favorite.add', at(
+                '/api/recipes/{}/favorite/', others
+            )),
+            ('recipes.favorite.remove', at(
+                '/api/recipes/{}/favorite/', others, method='delete'
+            )),
+            ('recipes.shopping_cart.add', at(
+                '/api/recipes/{}/shopping_cart/', others
+            )),
+            ('recipes.shopping_cart.remove', at(
+                '/api/recipes/{}/shopping_cart/', others, method='delete'
+            )),
+        ]
+        scenarios += [
+            (f'recipes.download_shopping_cart[{file_format}]', get(
+                '/api/recipes/download_shopping_cart/', format=file_format
+            ))
+            for file_format in ('pdf', 'txt', 'csv', 'json')
+        ]
+        scenarios += [
+            ('users.subscriptions', get('/api/users/subscriptions/')),
+            ('users.subscriptions[recipes_limit]', get(
+                '/api/users/subscriptions/', recipes_limit=3
+            )),
+            ('users.subscribe', at('/api/users/{}/subscribe/', authors)),
+            ('users.unsubscribe', at(
+                '/api/users/{}/subscribe/', authors, method='delete'
+            )),
+            ('users.create', lambda number: anonymous.post(
+                '/api/users/', {
+                    'email': f'user{number}@benchmark.test',
+                    'username': f'benchmark-user-{number}',
+                    'first_name': 'User', 'last_name': 'Benchmark',
+                    'password': PASSWORD,
+                }, format='json'
+            )),
+            ('users.set_password', lambda number: client.post(
+                '/api/users/set_password/',
+                {'current_password': PASSWORD, 'new_password': PASSWORD},
+                format='json'
+            )),
+            ('users.list', get('/api/users/')),
+            ('users.me', get('/api/users/me/')),
+            ('users.retrieve', get(f'/api/users/{author.id}/')),
+            ('tags.list', get('/api/tags/', anonymous)),
+            ('tags.retrieve', get(f'/api/tags/{tag.id}/', anonymous)),
+            ('ingredients.list', get('/api/ingredients/', anonymous)),
+            ('ingredients.search', get(
+                '/api/ingredients/', anonymous, name=word[:3]
+            )),
+            ('ingredients.retrieve', get(
+                f'/api/ingredients/{ingredients[0].id}/', anonymous
+            )),
+            ('auth.token.login', lambda number: anonymous.post(
+                '/api/auth/token/login/',
+                {'email': reader.email, 'password': PASSWORD},
+                format='json'
+            )),
+            ('auth.token.logout', lambda number: anonymous.post(
+                '/api/auth/token/logout/',
+                HTTP_AUTHORIZATION=tokens[number % len(tokens)]
+            )),
+            ('metrics', get('/api/metrics/', staff)),
+        ]
+        return scenarios
+
+    def compare(self, results):
+        """Fail on endpoints regressed past the thresholds."""
+
+        options = self.options
+        try:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(
+                f'No baseline at {options["baseline"]}, run with --save.'
+            )
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                self.stdout.write(f'{name}: not in the baseline.')
+                continue
+            limit = max(
+                expected['p95'] * (1 + options['latency_threshold']),
+                expected['p95'] + options['latency_floor']
+            )
+            if result['p95'] > limit:
+                regressions.append(
+                    f'{name}: p95 {result["p95"]:.2f} ms, '
+                    f'baseline {expected["p95"]:.2f} ms'
+                )
+            if result['queries'] > (
+                expected['queries'] + options['query_threshold']
+            ):
+                regressions.append(
+                    f'{name}: {result["queries"]} queries, '
+                    f'baseline {expected["queries"]}'
+                )
+            if result['memory'] > (
+                expected['memory'] * (1 + options['memory_threshold'])
+            ):
+                regressions.append(
+                    f'{name}: {result["memory"]:.0f} KiB, '
+                    f'baseline {expected["memory"]:.0f} KiB'
+                )
+        if regressions:
+            raise CommandError(
+                'Regressions past the thresholds:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
@@ -0,0 +1,47 @@
+import statistics
+import time
+
+from api.utils import register_font, render_shopping_cart
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Benchmark grocery list PDF rendering."""
+
+    help = 'Measure grocery list PDF render time against list length.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 100, 1000],
+            help='Grocery list lengths to render.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Renders per list length.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        register_font()
+        self.stdout.write(
+            f'Font registration: '
+            f'{(time.perf_counter() - started) * 1000:.1f} ms'
+        )
+        for size in options['sizes']:
+            ingredients = [
+                {
+                    'name': f'ingredient {number}',
+                    'measurement_unit': 'g',
+                    'amount': number,
+                }
+                for number in range(size)
+            ]
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                pdf = render_shopping_cart(ingredients)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{size:>6} lines: median {statistics.median(timings):.1f} ms,'
+                f' min {min(timings):.1f} ms, {len(pdf)} bytes'
+            )
@@ -0,0 +1,166 @@
+import http.client
+import os
+import shutil
+import statistics
+import subprocess
+import threading
+import time
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Ingredient, Recipe
+
+SERVERS = {
+    'wsgi': (
+        'gunicorn', 'foodgram.wsgi', '--workers', '{workers}',
+        '--bind', '127.0.0.1:{port}', '--log-level', 'warning'
+    ),
+    'asgi': (
+        'uvicorn', 'foodgram.asgi:application', '--workers', '{workers}',
+        '--port', '{port}', '--log-level', 'warning', '--no-access-log'
+    ),
+}
+STARTUP_TIMEOUT = 60
+
+
+def percentile(timings, share):
+    if len(timings) < 2:
+        return timings[0] if timings else 0
+    return statistics.quantiles(timings, n=100, method='inclusive')[share - 1]
+
+
+class Command(BaseCommand):
+    """Compare WSGI and ASGI servers under concurrent reads."""
+
+    help = (
+        'Start gunicorn sync workers and uvicorn on the configured '
+        'database and measure throughput and latency of the hot read '
+        'endpoints at several concurrency levels.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--servers', nargs='+', choices=SERVERS, default=list(SERVERS),
+            help='Servers to benchmark.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Worker processes of every server.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 8, 32],
+            help='Numbers of concurrent clients.'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds of load per concurrency level.'
+        )
+        parser.add_argument(
+            '--port', type=int, default=8701,
+            help='Port of the first server.'
+        )
+        parser.add_argument(
+            '--token', default=None,
+            help='Send requests with this authentication token.'
+        )
+
+    def handle(self, *args, **options):
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if recipe is None or ingredient is None:
+            raise CommandError('Seed the database with generate_dataset.')
+        self.paths = (
+            '/api/recipes/',
+            f'/api/recipes/{recipe.id}/',
+            f'/api/ingredients/?name={quote(ingredient.name[:3])}',
+        )
+        # Sync gunicorn workers close every connection, so both servers
+        # get a new connection per request.
+        self.headers = {'Host': 'localhost', 'Connection': 'close'}
+        if options['token']:
+            self.headers['Authorization'] = f'Token {options["token"]}'
+        self.stdout.write(
+            f'{"server":<8}{"clients":>8}{"req/s":>10}{"p50 ms":>9}'
+            f'{"p95 ms":>9}{"p99 ms":>9}{"errors":>8}'
+        )
+        for number, name in enumerate(options['servers']):
+            port = options['port'] + number
+            command = [
+                part.format(workers=options['workers'], port=port)
+                for part in SERVERS[name]
+            ]
+            if shutil.which(command[0]) is None:
+                raise CommandError(f'{command[0]} is not installed.')
+            server = subprocess.Popen(command, env=os.environ.copy())
+            try:
+                self.wait(port, server)
+                for clients in options['concurrency']:
+                    self.report(name, clients, self.load(
+                        port, clients, options['duration']
+                    ))
+            finally:
+                server.terminate()
+                server.wait()
+
+    def wait(self, port, server):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('Server exited during startup.')
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port)
+                connection.request('GET', self.paths[0], headers=self.headers)
+                if connection.getresponse().status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise CommandError('Server did not start in time.')
+
+    def load(self, port, clients, duration):
+        """Latencies in ms and error count of clients hitting the paths."""
+
+        timings = []
+        errors = []
+        deadline = time.monotonic() + duration
+
+        def client(offset):
+            local, failed = [], 0
+            number = offset
+            while time.monotonic() < deadline:
+                path = self.paths[number % len(self.paths)]
+                number += 1
+                started = time.perf_counter()
+                connection = http.client.HTTPConnection('127.0.0.1', port)
+                try:
+                    connection.request('GET', path, headers=self.headers)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        failed += 1
+                except (OSError, http.client.HTTPException):
+                    failed += 1
+                    continue
+                finally:
+                    connection.close()
+                local.append((time.perf_counter() - started) * 1000)
+            timings.extend(local)
+            errors.append(failed)
+
+        threads = [
+            threading.Thread(target=client, args=(offset,))
+            for offset in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings, sum(errors), duration
+
+    def report(self, name, clients, result):
+        timings, errors, duration = result
+        self.stdout.write(
+            f'{name:<8}{clients:>8}{len(timings) / duration:>10.1f}'
+            f'{percentile(timings, 50):>9.2f}{percentile(timings, 95):>9.2f}'
+            f'{percentile(timings, 99):>9.2f}{errors:>8}'
+        )
@@ -0,0 +1,17 @@
+from api.images import make_variants
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Make resized variants of stored recipe images."""
+
+    help = 'Make missing resized variants of every recipe image.'
+
+    def handle(self, *args, **options):
+        names = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        for name in names.iterator():
+            make_variants(name)
+        self.stdout.write(f'{names.count()} images processed.')
@@ -0,0 +1,142 @@
+import http.client
+import os
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+STARTUP_TIMEOUT = 60
+PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/?name=a')
+
+
+def children(pid):
+    """Process ids whose parent is the given process."""
+
+    found = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as stat:
+                parent = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            found.append(int(name))
+    return found
+
+
+def memory(pid):
+    """Resident and proportional set sizes of the process in MB.
+
+    The proportional size splits every shared page between the processes
+    mapping it, so summed over master and workers it is the memory the
+    server really takes.
+    """
+
+    values = {}
+    for path in (f'/proc/{pid}/smaps_rollup', f'/proc/{pid}/status'):
+        try:
+            with open(path) as file:
+                for line in file:
+                    key, _, rest = line.partition(':')
+                    if key in ('Rss', 'Pss', 'VmRSS'):
+                        values.setdefault(key, int(rest.split()[0]) / 1024)
+        except OSError:
+            continue
+    return values.get('Rss', values.get('VmRSS', 0)), values.get('Pss')
+
+
+class Command(BaseCommand):
+    """Measure startup time and memory of the gunicorn server."""
+
+    help = (
+        'Start gunicorn with gunicorn.conf.py, with and without a '
+        'preloaded app, and report the time to the first response, the '
+        'latency of the first requests and the memory of every process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Worker processes.'
+        )
+        parser.add_argument(
+            '--port', type=int, default=8711,
+            help='Port of the server.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=30,
+            help='Requests sent before memory is measured.'
+        )
+
+    def handle(self, *args, **options):
+        config = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+        self.stdout.write(
+            f'{"preload":<9}{"ready s":>9}{"first ms":>10}'
+            f'{"master MB":>11}{"worker MB":>11}{"total PSS MB":>14}'
+        )
+        for preload in (True, False):
+            command = [
+                'gunicorn', '--config', config, 'foodgram.wsgi',
+                '--bind', f'127.0.0.1:{options["port"]}',
+                '--workers', str(options['workers']),
+                '--log-level', 'warning',
+            ]
+            environment = {**os.environ, 'GUNICORN_PRELOAD': str(preload)}
+            started = time.perf_counter()
+            try:
+                server = subprocess.Popen(
+                    command, env=environment, cwd=settings.BASE_DIR
+                )
+            except FileNotFoundError:
+                raise CommandError('gunicorn is not installed.')
+            try:
+                self.measure(server, preload, started, options)
+            finally:
+                server.terminate()
+                server.wait()
+
+    def get(self, port, path):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        try:
+            connection.request('GET', path, headers={'Host': 'localhost'})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def measure(self, server, preload, started, options):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            if server.poll() is not None:
+                raise CommandError('gunicorn exited during startup.')
+            if time.monotonic() > deadline:
+                raise CommandError('gunicorn did not start in time.')
+            try:
+                if self.get(options['port'], PATHS[0]) == 200:
+                    break
+            except OSError:
+                time.sleep(0.05)
+        ready = time.perf_counter() - started
+        # Every worker serves a first request, the slowest is the cold one.
+        first = []
+        for number in range(options['workers'] * len(PATHS)):
+            request_started = time.perf_counter()
+            self.get(options['port'], PATHS[number % len(PATHS)])
+            first.append(time.perf_counter() - request_started)
+        for number in range(options['requests']):
+            self.get(options['port'], PATHS[number % len(PATHS)])
+        master_rss, master_pss = memory(server.pid)
+        workers = [memory(pid) for pid in children(server.pid)]
+        worker_rss = sum(rss for rss, _ in workers) / max(len(workers), 1)
+        total_pss = None
+        if master_pss is not None:
+            total_pss = master_pss + sum(pss or 0 for _, pss in workers)
+        self.stdout.write(
+            f'{str(preload):<9}{ready:>9.2f}{max(first) * 1000:>10.1f}'
+            f'{master_rss:>11.1f}{worker_rss:>11.1f}'
+            f'{total_pss if total_pss is not None else float("nan"):>14.1f}'
+        )
@@ -0,0 +1,338 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+from foodgram.settings import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        'Request latency.', SECONDS
+    ),
+    'db_duration_seconds': (
+        'SQL time per request.', SECONDS
+    ),
+    'db_queries': (
+        'SQL queries per request.', (0, 1, 2, 5, 10, 20, 50, 100, 200)
+    ),
+    'app_duration_seconds': (
+        'View time per request, excluding SQL and serializers.', SECONDS
+    ),
+    'serializer_duration_seconds': (
+        'Serializer time of list and detail reads, excluding SQL.', SECONDS
+    ),
+    'render_duration_seconds': (
+        'Response rendering time.', SECONDS
+    ),
+    'response_size_bytes': (
+        'Response body size.',
+        (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+    ),
+}
+
+ARCHIVE = 'archive.json'
+LOCK = '.lock'
+PREFIX = 'foodgram_'
+
+
+class Registry:
+    """Histograms of this process, shared across workers through files.
+
+    Every worker owns one file in ``METRICS_DIR``, so no write is ever
+    contended; a worker leaving merges its file into the archive.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.reset()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.retire)
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.data = {}
+        self.flushed = time.monotonic()
+
+    def observe(self, view, values):
+        """Add one request to the histograms of the view."""
+
+        with self.lock:
+            if os.getpid() != self.pid:
+                self.reset()
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                series = self.data.setdefault(name, {}).setdefault(
+                    view, {'buckets': [0] * (len(buckets) + 1),
+                           'sum': 0, 'count': 0}
+                )
+                series['buckets'][bisect_left(buckets, value)] += 1
+                series['sum'] += value
+                series['count'] += 1
+            if (
+                self.directory
+                and time.monotonic() - self.flushed >= METRICS_FLUSH_INTERVAL
+            ):
+                self.flush()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'{self.pid}.json')
+
+    def flush(self):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.data, file)
+        os.replace(temporary, self.path)
+        self.flushed = time.monotonic()
+
+    @contextmanager
+    def locked(self):
+        with open(os.path.join(self.directory, LOCK), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def retire(self):
+        """Merge histograms of the exiting worker into the archive."""
+
+        if os.getpid() != self.pid or not self.data:
+            return
+        with self.lock, self.locked():
+            archive = os.path.join(self.directory, ARCHIVE)
+            data = merge([read(archive), self.data])
+            with open(f'{archive}.tmp', 'w') as file:
+                json.dump(data, file)
+            os.replace(f'{archive}.tmp', archive)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.data = {}
+
+    def collect(self):
+        """Histograms of all workers, past and present."""
+
+        with self.lock:
+            if os.getpid() != self.pid:
+                self.reset()
+            if not self.directory:
+                return self.data
+            self.flush()
+            with self.locked():
+                return merge(
+                    read(os.path.join(self.directory, name))
+                    for name in os.listdir(self.directory)
+                    if name.endswith('.json')
+                )
+
+
+def read(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def merge(snapshots):
+    """Sum histograms of several snapshots."""
+
+    total = {}
+    for snapshot in snapshots:
+        for name, views in snapshot.items():
+            if name not in HISTOGRAMS:
+                continue
+            for view, series in views.items():
+                current = total.setdefault(name, {}).setdefault(
+                    view, {'buckets': [0] * len(series['buckets']),
+                           'sum': 0, 'count': 0}
+                )
+                if len(current['buckets']) != len(series['buckets']):
+                    continue
+                current['buckets'] = [
+                    a + b for a, b in zip(current['buckets'],
+                                          series['buckets'])
+                ]
+                current['sum'] += series['sum']
+                current['count'] += series['count']
+    return total
+
+
+def escape(value):
+    return (
+        value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+    )
+
+
+def exposition(data):
+    """Histograms in the Prometheus text format."""
+
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        metric = f'{PREFIX}{name}'
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for view, series in sorted(data.get(name, {}).items()):
+            label = f'view="{escape(view)}"'
+            cumulative = 0
+            bounds = [str(bound) for bound in buckets] + ['+Inf']
+            for bound, count in zip(bounds, series['buckets']):
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{metric}_sum{{{label}}} {series["sum"]}')
+            lines.append(f'{metric}_count{{{label}}} {series["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry(METRICS_DIR)
+
+
+class QueryTimer:
+    """SQL query count and time, and serializer time, of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.serializer = 0
+
+
+current_timer = ContextVar('current_timer', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper adding the query to the timer of the request.
+
+    The timer lives in a context variable, so queries that async views
+    run in executor threads are counted too.
+    """
+
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.duration += time.perf_counter() - started
+        timer.count += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def connect_query_timer():
+    connection_created.connect(
+        install_query_timer, dispatch_uid='api.metrics.query_timer'
+    )
+
+
+def timed_data(serializer):
+    """Data of the serializer, its time added to the request timer.
+
+    Queries it runs are left to the SQL time.
+    """
+
+    timer = current_timer.get()
+    if timer is None:
+        return serializer.data
+    started = time.perf_counter()
+    queries = timer.duration
+    try:
+        return serializer.data
+    finally:
+        timer.serializer += max(
+            time.perf_counter() - started - (timer.duration - queries), 0
+        )
+
+
+def view_name(view_func, method):
+    """Name of the view class and its action, like RecipeViewSet.list."""
+
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class MetricsMiddleware:
+    """Measure requests, report them in Server-Timing and histograms."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            timer = current_timer.get()
+            current_timer.reset(token)
+        return self.finish(request, response, started, timer)
+
+    async def __acall__(self, request):
+        started, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            timer = current_timer.get()
+            current_timer.reset(token)
+        return self.finish(request, response, started, timer)
+
+    def start(self, request):
+        request.metrics = {'view': 'unresolved', 'render': None}
+        return time.perf_counter(), current_timer.set(QueryTimer())
+
+    def finish(self, request, response, started, timer):
+        finished = time.perf_counter()
+        total = finished - started
+        rendering = request.metrics['render']
+        render = finished - rendering if rendering is not None else 0
+        app = max(total - render - timer.duration - timer.serializer, 0)
+        values = {
+            'request_duration_seconds': total,
+            'db_duration_seconds': timer.duration,
+            'db_queries': timer.count,
+            'app_duration_seconds': app,
+            'serializer_duration_seconds': timer.serializer,
+            'render_duration_seconds': render,
+        }
+        if not response.streaming:
+            values['response_size_bytes'] = len(response.content)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries"',
+            f'app;dur={app * 1000:.1f}',
+            f'serializer;dur={timer.serializer * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        registry.observe(request.metrics['view'], values)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics['view'] = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        request.metrics['render'] = time.perf_counter()
+        return response
@@ -0,0 +1,222 @@
+import hashlib
+import time
+
+from api.cache import membership_version, table_version
+from api.catalogs import ACCEPTS_GZIP, acatalog_response, catalog_response
+from api.metrics import timed_data
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from foodgram.routers import use_replica
+from foodgram.settings import REPLICA_STICKY_SECONDS
+from rest_framework import status
+from rest_framework.response import Response
+
+NANOSECONDS = 10 ** 9
+
+
+class ConditionalGetMixin:
+    """Answer unchanged list and detail reads with 304 Not Modified.
+
+    The ETag is derived from table version stamps, so a matching
+    conditional request is answered before any queryset is built.
+    """
+
+    version_tables = ()
+    per_user_state = False
+
+    def get_versions(self, request):
+        versions = [table_version(table) for table in self.version_tables]
+        if versions and (
+            time.time_ns() - max(versions)
+            < REPLICA_STICKY_SECONDS * NANOSECONDS
+        ):
+            # The response is tagged with the stamp, replicas may not have
+            # the rows behind it yet.
+            use_replica.set(False)
+        if self.per_user_state and request.user.is_authenticated:
+            versions.append(membership_version(request.user.id))
+        return versions
+
+    def get_etag(self, request, versions):
+        parts = [
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            request.user.id,
+            *versions
+        ]
+        digest = hashlib.sha1('|'.join(map(str, parts)).encode())
+        return f'"{digest.hexdigest()}"'
+
+    def get_conditional_state(self, request):
+        # No Last-Modified: stamps move by nanoseconds, a date in whole
+        # seconds would answer If-Modified-Since with 304 after a write.
+        etag = self.get_etag(request, self.get_versions(request))
+        return etag, get_conditional_response(request, etag=etag)
+
+    def finalize_conditional(self, response, etag):
+        if response.status_code in (
+            status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+        ):
+            response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, response = self.get_conditional_state(request)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        return self.finalize_conditional(response, etag)
+
+    async def aconditional_response(self, handler, request, *args, **kwargs):
+        etag, response = self.get_conditional_state(request)
+        if response is None:
+            response = await handler(request, *args, **kwargs)
+        return self.finalize_conditional(response, etag)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aconditional_response(
+            super().alist, request, *args, **kwargs
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aconditional_response(
+            super().aretrieve, request, *args, **kwargs
+        )
+
+
+class TimedReadMixin:
+    """List and retrieve actions reporting their serializer time."""
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(timed_data(serializer))
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(timed_data(serializer))
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        return Response(timed_data(serializer))
+
+
+class CachedCatalogMixin(ConditionalGetMixin):
+    """Serve the unfiltered JSON list from the pre-rendered catalog."""
+
+    catalog = None
+
+    def get_etag(self, request, versions):
+        etag = super().get_etag(request, versions)
+        if ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return f'{etag[:-1]}-gzip"'
+        return etag
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(self.catalog_list, request)
+
+    async def alist(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return await super().alist(request, *args, **kwargs)
+        return await self.aconditional_response(self.acatalog_list, request)
+
+    def catalog_list(self, request):
+        return catalog_response(self.catalog, request)
+
+    async def acatalog_list(self, request):
+        return await acatalog_response(self.catalog, request)
+
+
+class AsyncReadMixin:
+    """Serve GET actions with async handlers built on the async ORM.
+
+    ``as_async_view`` routes GET to the ``a<action>`` handler of the
+    viewset, running authentication, permissions and content negotiation
+    in a thread, and hands every other method to the sync viewset.
+    Serializers must find everything they read already fetched.
+    """
+
+    @classmethod
+    def as_async_view(cls, actions, **initkwargs):
+        sync_view = sync_to_async(cls.as_view(actions, **initkwargs))
+
+        async def view(request, *args, **kwargs):
+            action = actions.get(request.method.lower())
+            handler = getattr(cls, f'a{action}', None)
+            if request.method != 'GET' or handler is None:
+                return await sync_view(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = actions
+            self.args = args
+            self.kwargs = kwargs
+            request = self.initialize_request(request, *args, **kwargs)
+            self.request = request
+            self.headers = self.default_response_headers
+            try:
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                response = await getattr(self, f'a{action}')(
+                    request, *args, **kwargs
+                )
+            except Exception as exc:
+                response = self.handle_exception(exc)
+            self.response = self.finalize_response(
+                request, response, *args, **kwargs
+            )
+            return self.response
+
+        view.cls = cls
+        view.actions = actions
+        view.csrf_exempt = True
+        return view
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = None
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(
+                queryset, request, view=self
+            )
+        objects = page if page is not None else [
+            obj async for obj in queryset
+        ]
+        serializer = self.get_serializer_class()(
+            objects, many=True,
+            context=await sync_to_async(self.get_serializer_context)()
+        )
+        if page is not None:
+            return self.get_paginated_response(timed_data(serializer))
+        return Response(timed_data(serializer))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer_class()(
+            await self.aget_object(),
+            context=await sync_to_async(self.get_serializer_context)()
+        )
+        return Response(timed_data(serializer))
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{
+                self.lookup_field: self.kwargs[lookup_url_kwarg]
+            })
+        except (queryset.model.DoesNotExist, TypeError, ValueError,
+                ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
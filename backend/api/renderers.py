@@ -0,0 +1,42 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class FileRenderer(BaseRenderer):
+    """Renderer for file downloads.
+
+    File bodies are produced by the view, so only error details reach
+    the renderer; they are returned as JSON.
+    """
+
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data).encode()
+
+
+class PDFRenderer(FileRenderer):
+    """PDF file renderer."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class PlainTextRenderer(FileRenderer):
+    """Plain text file renderer."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(FileRenderer):
+    """CSV file renderer."""
+
+    media_type = 'text/csv'
+    format = 'csv'
@@ -1,9 +1,20 @@
+from collections import Counter
+
+from api.authentication import denylist, token_for
+from api.fields import Base64OrFileImageField
+from api.images import variant_urls
+from api.utils import get_limit
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
-from foodgram.settings import RECIPE_MAX_LENGTH
+from foodgram.settings import POS_ZERO, RECIPE_MAX_LENGTH
 from recipes.models import Follow, Ingredient, Recipe, RecipeIngredient, Tag
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from users.models import User
 
 
@@ -65,6 +76,8 @@ class CustomUserSerializer(UserSerializer):
     def get_is_subscribed(self, obj):
         if self.context.get('request').user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(
             author=obj,
             user=self.context.get('request').user
@@ -87,20 +100,40 @@ class RecipeListSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeIngredientsSerializer(many=True, source='ingredient')
-    is_favorited = serializers.BooleanField(
-        default=False, read_only=True, source='favored'
-    )
-    is_in_shopping_cart = serializers.BooleanField(
-        default=False, read_only=True, source='shoppings'
-    )
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_variants', 'text',
+            'cooking_time'
         )
 
+    def get_is_favorited(self, obj):
+        return obj.id in self.context.get('favorites', ())
+
+    def get_is_in_shopping_cart(self, obj):
+        return obj.id in self.context.get('shoppings', ())
+
+    def get_image_variants(self, obj):
+        if not obj.image:
+            return {}
+        request = self.context.get('request')
+        variants = variant_urls(obj.image.name, obj.image_variants)
+        if request is not None:
+            for urls in variants.values():
+                for width, url in urls.items():
+                    urls[width] = request.build_absolute_uri(url)
+        return variants
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_subscribed'):
+            instance.author.is_subscribed = instance.author_subscribed
+        return super().to_representation(instance)
+
 
 class CreateIngredientSerializer(serializers.ModelSerializer):
     """Create ingredient serializer."""
@@ -117,7 +150,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     """Recipe create serializer."""
 
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = Base64OrFileImageField()
     ingredients = CreateIngredientSerializer(many=True)
 
     class Meta:
@@ -130,41 +163,39 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Recipe name is more than 200 symbols.'
             )
-        ingredients = data.get('ingredients')
+        ingredients = data.get('ingredients', ())
         ingredients_list = [ingredient.get('id') for ingredient in ingredients]
-        count = Ingredient.objects.count()
+        found = Ingredient.objects.in_bulk(ingredients_list)
+        if set(ingredients_list) - found.keys():
+            raise serializers.ValidationError(
+                'There is no such ingredient.'
+            )
+        doubles = [
+            pk for pk, count in Counter(ingredients_list).items() if count > 1
+        ]
+        if doubles:
+            raise serializers.ValidationError(
+                f'Ingredient, {found[doubles[POS_ZERO]]}, '
+                f'picked more than once.'
+            )
         for ingredient in ingredients:
-            if ingredient.get('id') > count:
-                raise serializers.ValidationError(
-                    'There is no such ingredient.'
-                )
-            if ingredients_list.count(ingredient['id']) > 1:
-                double = Ingredient.objects.get(
-                    pk=ingredient.get('id')
-                )
-                raise serializers.ValidationError(
-                    f'Ingredient, {double}, '
-                    f'picked more than once.'
-                )
             if ingredient.get('amount') <= 0:
-                zero = Ingredient.objects.get(
-                    pk=ingredient.get('id')
-                )
                 raise serializers.ValidationError(
-                    f'Ingredient, {zero}, '
+                    f'Ingredient, {found[ingredient.get("id")]}, '
                     f'is 0 or less.'
                 )
         return data
 
     def create_ingredients(self, recipe, ingredients):
-        for ingredient in ingredients:
-            RecipeIngredient.objects.bulk_create([
-                RecipeIngredient(
-                    recipe=recipe,
-                    ingredient_id=ingredient.get('id'),
-                    amount=ingredient.get('amount'),)
-            ])
-
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient.get('id'),
+                amount=ingredient.get('amount'),)
+            for ingredient in ingredients
+        ])
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -173,9 +204,42 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.create_ingredients(recipe, ingredients)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        current = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient.get('id'): ingredient.get('amount')
+            for ingredient in ingredients
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for pk in current.keys() & amounts.keys():
+            if current[pk].amount != amounts[pk]:
+                current[pk].amount = amounts[pk]
+                changed.append(current[pk])
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient.get('id') not in current
+        ]
+        if added:
+            self.create_ingredients(recipe, added)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
+        instance = Recipe.objects.select_for_update(
+            of=('self',)
+        ).select_related('author').get(pk=instance.pk)
         instance.name = validated_data.get('name', instance.name)
-        instance.image = validated_data.get('image', instance.image)
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time
@@ -184,14 +248,23 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             tags = validated_data.get('tags')
             instance.tags.set(tags)
         if 'ingredients' in validated_data:
-            instance.ingredients.clear()
-            self.create_ingredients(
+            self.update_ingredients(
                 instance, validated_data.get('ingredients')
             )
-        instance.save()
+        instance.save(update_fields=(
+            'name', 'image', 'image_variants', 'text', 'cooking_time'
+        ))
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
         return RecipeListSerializer(
             instance,
             context={
@@ -217,7 +290,7 @@ class SubscribeSerializer(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField(source='author.last_name')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
 
     class Meta:
         model = Follow
@@ -227,16 +300,15 @@ class SubscribeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(
-            author=obj.author, user=obj.user
-        ).exists()
+        return True
 
     def get_recipes(self, obj):
-        queryset = Recipe.objects.filter(author=obj.author)
-        return SubscribeRecipeSerializer(queryset, many=True).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        recipes = getattr(obj.author, 'subscription_recipes', None)
+        if recipes is None:
+            recipes = obj.author.recipes.all()[
+                :get_limit(self.context.get('request'), 'recipes_limit')
+            ]
+        return SubscribeRecipeSerializer(recipes, many=True).data
 
 
 class SubscribeUserSerializer(serializers.ModelSerializer):
@@ -265,3 +337,38 @@ class SubscribeUserSerializer(serializers.ModelSerializer):
         return SubscribeSerializer(
             instance, context={'request': request}
         ).data
+
+
+class JWTCreateSerializer(TokenObtainPairSerializer):
+    """Signed token pair serializer."""
+
+    @classmethod
+    def get_token(cls, user):
+        return token_for(user)
+
+
+class JWTRefreshSerializer(serializers.Serializer):
+    """Refresh token rotation serializer."""
+
+    refresh = serializers.CharField()
+
+    def validate(self, data):
+        refresh = RefreshToken(data['refresh'])
+        user = User.objects.filter(
+            pk=refresh[api_settings.USER_ID_CLAIM], is_active=True
+        ).first()
+        if user is None:
+            raise TokenError('User is inactive or deleted.')
+        if not denylist.revoke(refresh):
+            raise TokenError('Token is revoked.')
+        token = token_for(user)
+        return {'refresh': str(token), 'access': str(token.access_token)}
+
+
+class JWTRevokeSerializer(serializers.Serializer):
+    """Refresh token revocation serializer."""
+
+    refresh = serializers.CharField()
+
+    def validate(self, data):
+        return {'refresh': RefreshToken(data['refresh'])}
@@ -0,0 +1,510 @@
+import io
+from unittest import mock
+
+from api.cache import table_version
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from foodgram.settings import FEED_FANOUT_LIMIT
+from recipes.models import (FavoriteRecipe, FeedEntry, Follow, Ingredient,
+                            Recipe, RecipeIngredient, Tag)
+from recipes.search import index_recipe
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+AUTHORS = 3
+AUTHOR_RECIPES = 4
+RECIPES = 8
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RecipeQueryCountTest(TestCase):
+    """Recipe reads take a fixed number of queries however many rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='password', first_name=name, last_name=name
+            ) for name in ('author', 'reader')
+        )
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=name)
+            for name, color in (('lunch', '#00FF00'), ('dinner', '#0000FF'))
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('flour', 'sugar', 'salt')
+        ]
+        for number in range(RECIPES):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Recipe {number}',
+                image='recipes/images/recipe.png', text='Text',
+                cooking_time=10
+            )
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=100)
+                for ingredient in ingredients
+            )
+        cls.recipe = recipe
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        FavoriteRecipe.objects.create(user=cls.reader, recipe=recipe)
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_list_anonymous(self):
+        with self.assertNumQueries(4):
+            response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], RECIPES)
+
+    def test_list_authenticated(self):
+        with self.assertNumQueries(7):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_favorited'])
+        self.assertTrue(
+            response.data['results'][0]['author']['is_subscribed']
+        )
+
+    def test_list_cursor(self):
+        with self.assertNumQueries(3):
+            response = self.anonymous.get('/api/recipes/?cursor=')
+        self.assertEqual(response.status_code, 200)
+
+    def test_cursor_walk(self):
+        url, ids = '/api/recipes/?cursor=', []
+        while url is not None:
+            with self.assertNumQueries(3):
+                response = self.anonymous.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        ))
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', 'WzFd', 'WyJub3QgYSBkYXRlIiwgMV0='):
+            response = self.anonymous.get(f'/api/recipes/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404)
+
+    def test_detail_anonymous(self):
+        with self.assertNumQueries(3):
+            response = self.anonymous.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+    def test_detail_authenticated(self):
+        with self.assertNumQueries(6):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_update(self):
+        author = APIClient()
+        author.force_authenticate(self.author)
+        ingredients = [
+            {'id': ingredient.id, 'amount': 200}
+            for ingredient in Ingredient.objects.all()
+        ]
+        with self.assertNumQueries(11):
+            response = author.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                {'ingredients': ingredients, 'name': 'Renamed'},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Renamed')
+
+    def test_cached_membership(self):
+        self.client.get('/api/recipes/')
+        with self.assertNumQueries(5):
+            self.client.get('/api/recipes/?page=2')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SubscriptionQueryCountTest(TestCase):
+    """Subscriptions take a fixed number of queries however many authors."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='password', first_name='reader', last_name='reader'
+        )
+        cls.recipes = {}
+        for number in range(AUTHORS):
+            author = User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='password',
+                first_name='author', last_name='author'
+            )
+            cls.recipes[author.id] = [
+                Recipe.objects.create(
+                    author=author, name=f'Recipe {recipe}',
+                    image='recipes/images/recipe.png', text='Text',
+                    cooking_time=10
+                ).id
+                for recipe in range(AUTHOR_RECIPES)
+            ][::-1]
+            Follow.objects.create(user=cls.reader, author=author)
+        # Recipes published at once come newest id first.
+        Recipe.objects.filter(author=author).update(pub_date=timezone.now())
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def recipe_ids(self, response):
+        return {
+            author['id']: [recipe['id'] for recipe in author['recipes']]
+            for author in response.data['results']
+        }
+
+    def test_list(self):
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], AUTHORS)
+        self.assertEqual(self.recipe_ids(response), self.recipes)
+
+    def test_recipes_limit(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                '/api/users/subscriptions/?recipes_limit=2'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.recipe_ids(response), {
+            author: recipes[:2] for author, recipes in self.recipes.items()
+        })
+        self.assertEqual(
+            {author['recipes_count'] for author in response.data['results']},
+            {AUTHOR_RECIPES}
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CounterTest(TestCase):
+    """Counter columns follow the rows they count."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='password', first_name=name, last_name=name
+            ) for name in ('author', 'reader')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Recipe',
+            image='recipes/images/recipe.png', text='Text', cooking_time=10
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def counters(self):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        return (
+            self.recipe.favorites_count, self.recipe.in_carts_count,
+            self.author.recipes_count, self.author.followers_count
+        )
+
+    def test_favorite_and_cart(self):
+        for action, counters in (
+            ('favorite', (1, 0, 1, 0)), ('shopping_cart', (1, 1, 1, 0))
+        ):
+            url = f'/api/recipes/{self.recipe.id}/{action}/'
+            self.assertEqual(self.client.post(url).status_code, 201)
+            self.assertEqual(self.client.post(url).status_code, 400)
+            self.assertEqual(self.counters(), counters)
+        for action, counters in (
+            ('favorite', (0, 1, 1, 0)), ('shopping_cart', (0, 0, 1, 0))
+        ):
+            url = f'/api/recipes/{self.recipe.id}/{action}/'
+            self.assertEqual(self.client.delete(url).status_code, 204)
+            self.assertEqual(self.client.delete(url).status_code, 400)
+            self.assertEqual(self.counters(), counters)
+
+    def test_follow_and_recipe(self):
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        recipe = Recipe.objects.create(
+            author=self.author, name='Another',
+            image='recipes/images/recipe.png', text='Text', cooking_time=10
+        )
+        self.assertEqual(self.counters(), (0, 0, 2, 1))
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        recipe.delete()
+        self.assertEqual(self.counters(), (0, 0, 1, 0))
+
+    def test_stale_save(self):
+        recipe = Recipe.objects.get(id=self.recipe.id)
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        recipe.name = 'Renamed'
+        recipe.save()
+        self.assertEqual(self.counters(), (1, 0, 1, 0))
+
+    def test_recount(self):
+        Recipe.objects.update(favorites_count=5, in_carts_count=5)
+        User.objects.update(recipes_count=0, followers_count=3)
+        call_command('recount_counters', stdout=io.StringIO())
+        self.assertEqual(self.counters(), (0, 0, 1, 0))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchTest(TestCase):
+    """Search finds recipes holding every word, most relevant first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='author', last_name='author'
+        )
+        cls.apple = Ingredient.objects.create(
+            name='Apple', measurement_unit='g'
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Images of the fixtures are not stored, nothing to resize.
+        patcher = mock.patch('api.images.schedule_variants')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.in_text = self.create('Pie', 'Baked with an apple')
+            self.in_ingredients = self.create('Pie', 'Baked', self.apple)
+            self.in_name = self.create('Apple pie', 'Baked', self.apple)
+            self.create('Hedgehog soup', 'Ёжик')
+
+    def create(self, name, text, ingredient=None):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, image='recipes/images/recipe.png',
+            text=text, cooking_time=10
+        )
+        if ingredient is not None:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+        return recipe
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_ranking(self):
+        self.assertEqual(self.search('APPLE'), [
+            self.in_name.id, self.in_ingredients.id, self.in_text.id
+        ])
+
+    def test_every_word(self):
+        self.assertEqual(self.search('baked apple pie'), [
+            self.in_name.id, self.in_ingredients.id, self.in_text.id
+        ])
+        self.assertEqual(self.search('apple soup'), [])
+        self.assertEqual(len(self.search('ЕЖИК')), 1)
+
+    def test_reindex(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.apple.name = 'Pear'
+            self.apple.save()
+            self.in_text.name = 'Tart'
+            self.in_text.save()
+        self.assertEqual(self.search('apple'), [
+            self.in_name.id, self.in_text.id
+        ])
+        self.assertEqual(self.search('pear'), [
+            self.in_name.id, self.in_ingredients.id
+        ])
+        self.assertEqual(self.search('tart'), [self.in_text.id])
+
+    def test_reindex_once(self):
+        with mock.patch(
+            'recipes.search.index_recipe', wraps=index_recipe
+        ) as index, self.captureOnCommitCallbacks(execute=True):
+            recipe = self.create('Cake', 'Baked', self.apple)
+            recipe.text = 'Baked twice'
+            recipe.save()
+        index.assert_called_once_with(recipe.id)
+        self.assertEqual(self.search('twice'), [recipe.id])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FeedTest(TestCase):
+    """The feed merges pushed timelines with recipes of popular authors."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author, cls.star, cls.stranger = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='password', first_name=name, last_name=name
+            ) for name in ('reader', 'author', 'star', 'stranger')
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        # Images of the fixtures are not stored, nothing to resize.
+        patcher = mock.patch('api.images.schedule_variants')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.backfilled = self.create(self.author, 3)
+            Follow.objects.create(user=self.reader, author=self.star)
+            User.objects.filter(id=self.star.id).update(
+                followers_count=FEED_FANOUT_LIMIT + 1
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pushed = self.create(self.author, 2)
+            self.pulled = self.create(self.star, 4)
+            self.create(self.stranger, 2)
+
+    def create(self, author, number):
+        return [
+            Recipe.objects.create(
+                author=author, name='Recipe',
+                image='recipes/images/recipe.png', text='Text',
+                cooking_time=10
+            ).id
+            for _ in range(number)
+        ]
+
+    def walk(self):
+        url, ids = '/api/recipes/feed/', []
+        while url is not None:
+            # Favorite and cart sets are cached from the first page on.
+            with self.assertNumQueries(6 if ids else 8):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_fan_out(self):
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.reader).values_list(
+                'recipe_id', flat=True
+            )),
+            {*self.backfilled, *self.pushed}
+        )
+
+    def test_walk(self):
+        self.assertEqual(self.walk(), list(Recipe.objects.filter(
+            id__in=[*self.backfilled, *self.pushed, *self.pulled]
+        ).order_by('-pub_date', '-id').values_list('id', flat=True)))
+
+    def test_unfollow(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(self.walk(), self.pulled[::-1])
+
+    def test_rebuild(self):
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feeds', stdout=io.StringIO())
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(),
+            len(self.backfilled) + len(self.pushed)
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TableVersionTest(TestCase):
+    """Version stamps move only once writes are committed."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_moves_on_commit(self):
+        version = table_version('recipes')
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='lunch', color='#00FF00', slug='lunch')
+            self.assertEqual(table_version('recipes'), version)
+        self.assertNotEqual(table_version('recipes'), version)
+
+    def test_kept_on_rollback(self):
+        version = table_version('recipes')
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Tag.objects.create(
+                    name='lunch', color='#00FF00', slug='lunch'
+                )
+                raise RuntimeError
+        self.assertEqual(table_version('recipes'), version)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConditionalGetTest(TestCase):
+    """Conditional reads never answer 304 over a change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='password', first_name='reader', last_name='reader'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Recipe', image='recipes/images/recipe.png',
+            text='Text', cooking_time=10
+        )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_etag(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(self.client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag']
+        ).status_code, 304)
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        response = self.client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_favorited'])
+
+    def test_if_modified_since_only(self):
+        self.client.get('/api/recipes/')
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        response = self.client.get(
+            '/api/recipes/', HTTP_IF_MODIFIED_SINCE=http_date()
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_favorited'])
@@ -1,6 +1,9 @@
-from api.views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
-                       SubscribeView, SubscriptionsList, TagViewSet)
-from django.urls import include, path
+from api.views import (CustomUserViewSet, IngredientViewSet, JWTCreateView,
+                       JWTRefreshView, JWTRevokeView, MetricsView,
+                       RecipeViewSet, SubscribeView, SubscriptionsList,
+                       TagViewSet)
+from django.urls import include, path, re_path
+from foodgram.settings import ASYNC_READS, JWT_AUTH
 from rest_framework.routers import DefaultRouter
 
 v1_router = DefaultRouter()
@@ -12,7 +15,31 @@ v1_router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 urlpatterns = [
     path(r'users/subscriptions/', SubscriptionsList.as_view({'get': 'list'})),
     path(r'users/<int:user_id>/subscribe/', SubscribeView.as_view()),
+    path(r'metrics/', MetricsView.as_view()),
     path('', include(v1_router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if JWT_AUTH:
+    urlpatterns += [
+        path('auth/jwt/create/', JWTCreateView.as_view()),
+        path('auth/jwt/refresh/', JWTRefreshView.as_view()),
+        path('auth/jwt/revoke/', JWTRevokeView.as_view()),
+    ]
+
+if ASYNC_READS:
+    urlpatterns = [
+        path('recipes/', RecipeViewSet.as_async_view(
+            {'get': 'list', 'post': 'create'},
+            basename='recipes', detail=False
+        )),
+        re_path(r'^recipes/(?P<pk>[0-9]+)/$', RecipeViewSet.as_async_view(
+            {'get': 'retrieve', 'put': 'update',
+             'patch': 'partial_update', 'delete': 'destroy'},
+            basename='recipes', detail=True
+        )),
+        path('ingredients/', IngredientViewSet.as_async_view(
+            {'get': 'list'}, basename='ingredients', detail=False
+        )),
+    ] + urlpatterns
@@ -1,86 +1,225 @@
+import csv
+import hashlib
 import io
+import itertools
+import json
 
+from api.cache import invalidate_membership
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import F, Sum
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from foodgram.settings import (FONT_COLOR, FOOT_FONT, FOOT_RIGHT, FOOT_UP,
-                               HEAD_FONT, HEAD_RIGHT, HEAD_UP, HEIGHT_CROP,
+from foodgram.settings import (FONT_COLOR, FONT_NAME, FONT_PATH, FOOT_FONT,
+                               FOOT_RIGHT, FOOT_UP, HEAD_FONT, HEAD_RIGHT,
+                               HEAD_UP, HEIGHT_BOTTOM, HEIGHT_CROP,
                                HEIGHT_MAIN, MAIN_FONT, MAIN_RIGHT, POS_ONE,
-                               POS_TWO, POS_ZERO)
+                               SHOPPING_CART_CHUNK, SHOPPING_CART_PDF_TTL)
+from recipes.counters import apply_counters
+from recipes.models import RecipeIngredient
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 
+def get_limit(request, param):
+    """Positive integer query parameter or None when it is missing."""
+
+    limit = request.query_params.get(param)
+    if limit is None:
+        return None
+    if not limit.isdigit() or int(limit) < 1:
+        raise ValidationError({param: 'Must be a positive integer.'})
+    return int(limit)
+
+
+def insert_ignore(model, **values):
+    """Insert the row unless it breaks a unique constraint.
+
+    A single INSERT ... ON CONFLICT DO NOTHING, supported by PostgreSQL
+    and SQLite, returning the number of inserted rows, which
+    bulk_create(ignore_conflicts=True) cannot report. No post_save is
+    sent: callers apply the counters it would have changed through
+    recipes.counters.apply_counters.
+    """
+
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(model._meta.get_field(name).column) for name in values
+    )
+    placeholders = ', '.join(['%s'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+            f'VALUES ({placeholders}) ON CONFLICT DO NOTHING',
+            list(values.values())
+        )
+        return cursor.rowcount
+
+
+def raw_delete(queryset):
+    """Delete the rows with a single DELETE, returning their number.
+
+    QuerySet.delete() selects the rows first to send post_delete for each
+    of them. No signal is sent here: callers apply the counters it would
+    have changed through recipes.counters.apply_counters.
+    """
+
+    return queryset._raw_delete(queryset.db)
+
+
 def post(request, pk, get_object, models, serializer):
     """Post."""
 
     obj = get_object_or_404(get_object, id=pk)
-    if models.objects.filter(
-        recipe=obj, user=request.user
-    ).exists():
-        return Response(
-            {'message':
-                f'You have already added {obj}.'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+    values = {'recipe_id': obj.id, 'user_id': request.user.id}
+    with transaction.atomic():
+        if not insert_ignore(models, **values):
+            return Response(
+                {'message':
+                    f'You have already added {obj}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        apply_counters(models, 1, **values)
+    invalidate_membership(request.user.id)
     serializer = serializer(
-        obj, context={request: 'request'}
+        obj, context={'request': request}
     )
-    models.objects.create(
-        recipe=obj, user=request.user
-    )
-    return serializer.data
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 def delete(request, pk, get_object, models):
     """Delete."""
 
-    obj = get_object_or_404(get_object, id=pk)
-    if not models.objects.filter(
-        recipe=obj, user=request.user
-    ).exists():
+    values = {'recipe_id': pk, 'user_id': request.user.id}
+    with transaction.atomic():
+        deleted = raw_delete(models.objects.filter(**values))
+        if deleted:
+            apply_counters(models, -1, **values)
+    if not deleted:
+        obj = get_object_or_404(get_object, id=pk)
         return Response(
             {'message':
-                f'You have not added recipe {obj}.'}
+                f'You have not added recipe {obj}.'},
+            status=status.HTTP_400_BAD_REQUEST
         )
-    models.objects.filter(
-        recipe=obj, user=request.user
-    ).delete()
+    invalidate_membership(request.user.id)
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-def make_shopping_cart(ingredients):
-    """Make shopping cart."""
+class Echo:
+    """Pseudo buffer returning written value."""
 
-    grocery_list = {}
-    download = io.BytesIO()
-    pdfmetrics.registerFont(
-        TTFont('verdana', 'fonts/Verdana.ttf', 'UTF-8'))
-    for ingredient in ingredients:
-        if ingredient[POS_ZERO] not in grocery_list:
-            grocery_list[ingredient[POS_ZERO]] = {
-                'measurement_unit': ingredient[POS_ONE],
-                'amount': ingredient[POS_TWO]
-            }
-        else:
-            grocery_list[ingredient[POS_ZERO]]['amount'] += ingredient[POS_TWO]
-    report = canvas.Canvas(download)
-    report.setFont('verdana', HEAD_FONT)
-    report.drawString(HEAD_RIGHT, HEAD_UP, 'My grocery list:')
-    height = HEIGHT_MAIN
-    report.setFont('verdana', MAIN_FONT)
-    for i, (name, data) in enumerate(grocery_list.items(), POS_ONE):
-        report.drawString(MAIN_RIGHT, height, (f'{i}. {name.capitalize()} - '
-                                               f'{data["amount"]} '
-                                               f'{data["measurement_unit"]}'))
-        height -= HEIGHT_CROP
-    report.setFont('verdana', FOOT_FONT)
+    def write(self, value):
+        return value
+
+
+def get_shopping_cart(user):
+    """Ingredient amounts of the user shopping cart summed in database."""
+
+    return RecipeIngredient.objects.filter(
+        recipe__shopping__user=user
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).annotate(
+        amount=Sum('amount')
+    ).order_by('name', 'measurement_unit')
+
+
+def shopping_cart_lines(ingredients):
+    """Numbered lines of the grocery list."""
+
+    for i, ingredient in enumerate(ingredients, POS_ONE):
+        yield (f'{i}. {ingredient["name"].capitalize()} - '
+               f'{ingredient["amount"]} {ingredient["measurement_unit"]}')
+
+
+def stream_shopping_cart(ingredients, file_format):
+    """Stream grocery list as plain text or csv."""
+
+    ingredients = ingredients.iterator(chunk_size=SHOPPING_CART_CHUNK)
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        fields = ('name', 'measurement_unit', 'amount')
+        rows = itertools.chain(
+            (writer.writerow(fields),),
+            (
+                writer.writerow([row[field] for field in fields])
+                for row in ingredients
+            )
+        )
+        content_type = 'text/csv'
+    else:
+        rows = (f'{line}\n' for line in shopping_cart_lines(ingredients))
+        content_type = 'text/plain'
+    response = StreamingHttpResponse(
+        rows, content_type=f'{content_type}; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="grocery_list.{file_format}"'
+    )
+    return response
+
+
+def register_font():
+    """Register the PDF font once per process."""
+
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH, 'UTF-8'))
+
+
+def draw_footer(report):
+    """Draw page footer and start a new page."""
+
+    report.setFont(FONT_NAME, FOOT_FONT)
     report.setFillColorRGB(FONT_COLOR, FONT_COLOR, FONT_COLOR)
     report.drawCentredString(
         FOOT_RIGHT, FOOT_UP, 'Foodgram grocery assistant.'
     )
     report.showPage()
+
+
+def render_shopping_cart(ingredients):
+    """Render grocery list to PDF bytes, one page after another."""
+
+    register_font()
+    download = io.BytesIO()
+    report = canvas.Canvas(download)
+    report.setFont(FONT_NAME, HEAD_FONT)
+    report.drawString(HEAD_RIGHT, HEAD_UP, 'My grocery list:')
+    height = HEIGHT_MAIN
+    report.setFont(FONT_NAME, MAIN_FONT)
+    for line in shopping_cart_lines(ingredients):
+        if height < HEIGHT_BOTTOM:
+            draw_footer(report)
+            report.setFont(FONT_NAME, MAIN_FONT)
+            height = HEAD_UP
+        report.drawString(MAIN_RIGHT, height, line)
+        height -= HEIGHT_CROP
+    draw_footer(report)
     report.save()
-    download.seek(POS_ZERO)
-    return download
+    return download.getvalue()
+
+
+def make_shopping_cart(ingredients):
+    """Make shopping cart.
+
+    Rendered PDF is cached under the hash of the grocery list, so an
+    unchanged cart is downloaded without rendering.
+    """
+
+    ingredients = list(ingredients)
+    digest = hashlib.sha256(
+        json.dumps(ingredients, sort_keys=True).encode()
+    ).hexdigest()
+    key = f'shopping-cart-pdf:{digest}'
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render_shopping_cart(ingredients)
+        cache.set(key, pdf, SHOPPING_CART_PDF_TTL)
+    return io.BytesIO(pdf)
@@ -1,25 +1,47 @@
+from api.authentication import denylist
+from api.cache import bump_table_version, get_recipe_ids
 from api.filters import IngredientSearchFilter
+from api.indexes import ingredient_index
+from api.metrics import exposition, registry, timed_data
+from api.mixins import (AsyncReadMixin, CachedCatalogMixin,
+                        ConditionalGetMixin, TimedReadMixin)
+from api.pagination import FeedPagination, PageOrCursorPagination
 from api.permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from api.renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
 from api.serializers import (CustomUserSerializer, IngredientSerializer,
-                             RecipeCreateSerializer, RecipeListSerializer,
-                             SubscribeRecipeSerializer, SubscribeSerializer,
-                             SubscribeUserSerializer, TagSerializer)
-from api.utils import delete, make_shopping_cart, post
-from django.db.models import Exists, OuterRef
-from django.http import FileResponse
+                             JWTCreateSerializer, JWTRefreshSerializer,
+                             JWTRevokeSerializer, RecipeCreateSerializer,
+                             RecipeListSerializer, SubscribeRecipeSerializer,
+                             SubscribeSerializer, SubscribeUserSerializer,
+                             TagSerializer)
+from api.utils import (delete, get_limit, get_shopping_cart,
+                       make_shopping_cart, post, stream_shopping_cart)
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db.models import Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, HttpResponse
 from django.shortcuts import get_object_or_404
 from djoser import views
 from recipes.models import (FavoriteRecipe, Follow, Ingredient, Recipe,
                             RecipeIngredient, ShoppingCart, Tag)
+from recipes.search import search_recipes
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import (SAFE_METHODS, AllowAny, IsAdminUser,
+                                        IsAuthenticated)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.views import TokenViewBase
 from users.models import User
 
 
-class ListViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class ListViewSet(
+    TimedReadMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
     """List viewset mixin."""
 
 
@@ -30,28 +52,45 @@ class CustomUserViewSet(views.UserViewSet):
     serializer_class = CustomUserSerializer
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+    CachedCatalogMixin, TimedReadMixin, viewsets.ReadOnlyModelViewSet
+):
     """Tag viewset."""
 
+    version_tables = ('tags',)
+    catalog = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin, AsyncReadMixin, TimedReadMixin, viewsets.ModelViewSet
+):
     """Recipe viewset."""
 
+    version_tables = ('recipes',)
+    per_user_state = True
     permission_classes = (IsAuthorOrReadOnly | IsAdminOrReadOnly,)
+    pagination_class = PageOrCursorPagination
+    parser_classes = (JSONParser, MultiPartParser)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
 
     def get_queryset(self):
-        queryset = Recipe.objects.select_related(
-            'author'
-        ).prefetch_related('tags')
+        queryset = Recipe.objects.select_related('author')
+        if self.request.method not in SAFE_METHODS:
+            # Writes only check the author, updates lock and re-read the
+            # recipe themselves.
+            return queryset
         favorited = self.request.query_params.get('is_favorited')
         shopping_cart = self.request.query_params.get('is_in_shopping_cart')
         author = self.request.query_params.get('author')
         tags = self.request.query_params.getlist('tags')
+        search = self.request.query_params.get('search')
         if favorited:
             queryset = queryset.filter(favorite__user=self.request.user)
         if shopping_cart:
@@ -60,30 +99,50 @@ class RecipeViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(author=author)
         if tags:
             queryset = queryset.filter(tags__slug__in=tags).distinct()
+        if search:
+            queryset = search_recipes(queryset, search)
+        return self.prepare_queryset(queryset)
+
+    def prepare_queryset(self, queryset):
         if self.request.user.is_authenticated:
-            return queryset.annotate(
-                favored=Exists(
-                    queryset.filter(
-                        favorite__user=self.request.user,
-                        favorite__recipe=OuterRef('id'),
-                    )
-                ),
-                shoppings=Exists(
-                    queryset.filter(
-                        shopping__user=self.request.user,
-                        shopping__recipe=OuterRef('id'),
+            queryset = queryset.annotate(
+                author_subscribed=Exists(
+                    Follow.objects.filter(
+                        user=self.request.user,
+                        author=OuterRef('author'),
                     )
                 ),
             )
-        return queryset
+        return queryset.prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeListSerializer
         return RecipeCreateSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if (
+            self.request.method == 'GET'
+            and self.request.user.is_authenticated
+        ):
+            context['favorites'] = get_recipe_ids(
+                self.request.user, 'favorite'
+            )
+            context['shoppings'] = get_recipe_ids(
+                self.request.user, 'shopping'
+            )
+        return context
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        bump_table_version('recipes')
 
     @action(
         detail=True,
@@ -92,11 +151,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk=None):
         if request.method == 'POST':
-            data = post(
+            return post(
                 request, pk, Recipe,
                 FavoriteRecipe, SubscribeRecipeSerializer
             )
-            return Response(data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
             return delete(request, pk, Recipe, FavoriteRecipe)
         return Response(status=status.HTTP_400_BAD_REQUEST)
@@ -108,22 +166,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk=None):
         if request.method == 'POST':
-            data = post(
+            return post(
                 request, pk, Recipe,
                 ShoppingCart, SubscribeRecipeSerializer
             )
-            return Response(data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
             return delete(request, pk, Recipe, ShoppingCart)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, permission_classes=[IsAuthenticated])
-    def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping__user=request.user
-        ).values_list(
-            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    def feed(self, request):
+        return self.conditional_response(self.feed_list, request)
+
+    def feed_list(self, request):
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(
+            self.prepare_queryset(Recipe.objects.select_related('author')),
+            request, view=self
         )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(timed_data(serializer))
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            PDFRenderer, PlainTextRenderer, CSVRenderer, JSONRenderer
+        ]
+    )
+    def download_shopping_cart(self, request):
+        ingredients = get_shopping_cart(request.user)
+        file_format = request.accepted_renderer.format
+        if file_format == 'json':
+            return Response(list(ingredients))
+        if file_format != 'pdf':
+            return stream_shopping_cart(ingredients, file_format)
         return FileResponse(
             make_shopping_cart(ingredients),
             as_attachment=True,
@@ -137,7 +214,8 @@ class SubscribeView(APIView):
 
     def post(self, request, user_id):
         serializer = SubscribeUserSerializer(
-            data={'user': request.user.id, 'author': user_id}
+            data={'user': request.user.id, 'author': user_id},
+            context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -158,17 +236,104 @@ class SubscriptionsList(ListViewSet):
 
     serializer_class = SubscribeSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = PageOrCursorPagination
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
-        return Follow.objects.filter(user=self.request.user)
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time', 'author_id', 'pub_date'
+        ).order_by('-pub_date', '-id')
+        limit = get_limit(self.request, 'recipes_limit')
+        if limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author'),
+                    order_by=(F('pub_date').desc(), F('id').desc()),
+                )
+            ).filter(row_number__lte=limit)
+        return Follow.objects.filter(
+            user=self.request.user
+        ).select_related('author').prefetch_related(
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='subscription_recipes')
+        )
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    CachedCatalogMixin, AsyncReadMixin, TimedReadMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """Ingredient viewset."""
 
+    version_tables = ('ingredients',)
+    catalog = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (IsAdminOrReadOnly,)
     filter_backends = (IngredientSearchFilter,)
     search_fields = ('^name',)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientSearchFilter.search_param)
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(self.search, request, name)
+
+    def search(self, request, name):
+        return Response(
+            ingredient_index.search(name, get_limit(request, 'limit'))
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientSearchFilter.search_param)
+        if not name:
+            return await super().alist(request, *args, **kwargs)
+        return await self.aconditional_response(self.asearch, request, name)
+
+    async def asearch(self, request, name):
+        return Response(
+            await ingredient_index.asearch(name, get_limit(request, 'limit'))
+        )
+
+
+class MetricsView(APIView):
+    """Request histograms of all workers in the Prometheus text format."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            exposition(registry.collect()),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class JWTCreateView(TokenViewBase):
+    """Signed token pair for email and password."""
+
+    serializer_class = JWTCreateSerializer
+
+
+class JWTRefreshView(TokenViewBase):
+    """New token pair for a refresh token, which is revoked."""
+
+    serializer_class = JWTRefreshSerializer
+
+
+class JWTRevokeView(APIView):
+    """Revoke a refresh token and the access token of the request."""
+
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        serializer = JWTRevokeSerializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as error:
+            raise InvalidToken(error.args[0])
+        denylist.revoke(serializer.validated_data['refresh'])
+        if isinstance(request.auth, AccessToken):
+            denylist.revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,27 @@
+from importlib import import_module
+
+from api.catalogs import warm_catalogs
+from api.indexes import ingredient_index
+from api.utils import register_font
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+def warm_up():
+    """Load everything requests share before the first one arrives.
+
+    Imports the URLconf with its views, renders the catalogs, builds the
+    ingredient index and registers the PDF font. The database
+    connections used here are closed, so forked workers never share a
+    socket.
+    """
+
+    import_module(settings.ROOT_URLCONF)
+    register_font()
+    try:
+        warm_catalogs()
+        ingredient_index.refresh()
+    except DatabaseError:
+        pass
+    finally:
+        connections.close_all()
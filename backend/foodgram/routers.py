@@ -0,0 +1,177 @@
+import hashlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Response fields carrying issued credentials, with their header keyword.
+ISSUED_CREDENTIALS = (('auth_token', 'Token'), ('access', 'Bearer'))
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+def replicas():
+    """Aliases of the read replicas."""
+
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+class ReplicaHealth:
+    """Replica probes, repeated at most once per interval per process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}
+
+    def probe(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError:
+            connections[alias].close()
+            return False
+        return True
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            healthy, checked = self.checked.get(alias, (True, None))
+            if (
+                checked is not None
+                and now - checked < settings.REPLICA_HEALTH_INTERVAL
+            ):
+                return healthy
+            self.checked[alias] = (healthy, now)
+        healthy = self.probe(alias)
+        with self.lock:
+            self.checked[alias] = (healthy, now)
+        return healthy
+
+
+health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    """Send reads of safe requests to a healthy replica.
+
+    Everything else, including management commands and reads inside a
+    transaction, goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not use_replica.get() or connections[
+            DEFAULT_DB_ALIAS
+        ].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        healthy = [alias for alias in replicas() if health.is_healthy(alias)]
+        if not healthy:
+            return DEFAULT_DB_ALIAS
+        return random.choice(healthy)
+
+    def db_for_write(self, model, **hints):
+        use_replica.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def credentials_key(credentials):
+    """Cache key pinning the credentials to the primary."""
+
+    digest = hashlib.sha1(credentials.encode()).hexdigest()
+    return f'replica-pin:{digest}'
+
+
+def writer_key(request):
+    """Cache key of the client credentials, None for anonymous requests."""
+
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return credentials_key(credentials)
+
+
+def issued_keys(response):
+    """Cache keys of the credentials issued in a successful response.
+
+    A token created on the primary is unknown to the replicas for a
+    while, the next requests made with it must not be sent there.
+    """
+
+    data = getattr(response, 'data', None)
+    if not response.status_code < 300 or not isinstance(data, dict):
+        return []
+    return [
+        credentials_key(f'{keyword} {data[field]}')
+        for field, keyword in ISSUED_CREDENTIALS if data.get(field)
+    ]
+
+
+class ReplicaMiddleware:
+    """Allow replica reads in safe requests, pin writers to the primary.
+
+    A client that has just written reads from the primary for
+    ``REPLICA_STICKY_SECONDS``, so it always sees its own writes, and
+    so does a client using credentials it has just been issued.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        token = use_replica.set(self.allows_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        token = use_replica.set(self.allows_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        self.pin(request, response)
+        return response
+
+    def allows_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        key = writer_key(request)
+        return key is None or cache.get(key) is None
+
+    def pin(self, request, response):
+        if request.method in SAFE_METHODS:
+            return
+        keys = [writer_key(request), *issued_keys(response)]
+        cache.set_many(
+            dict.fromkeys(filter(None, keys), True),
+            settings.REPLICA_STICKY_SECONDS
+        )
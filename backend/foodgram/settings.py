@@ -1,5 +1,7 @@
 # -flake8: noqa
 import os
+import tempfile
+from datetime import timedelta
 
 from dotenv import load_dotenv
 
@@ -13,6 +15,10 @@ SECRET_KEY = os.getenv('SECRET_KEY', default='blahblahblah')
 
 DEBUG = (os.getenv('DEBUG', 'False') == 'True')
 
+ASYNC_READS = (os.getenv('ASYNC_READS', 'False') == 'True')
+
+JWT_AUTH = (os.getenv('JWT_AUTH', 'False') == 'True')
+
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '127.0.0.1,localhost').split(',')
 
 INSTALLED_APPS = [
@@ -32,6 +38,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'foodgram.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +69,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
@@ -82,6 +92,48 @@ DATABASES = {
     }
 }
 
+if os.getenv('SQLITE_PATH'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH'),
+    }
+
+# Persistent connections, checked before reuse after a request ends.
+DATABASES['default'].update(
+    CONN_MAX_AGE=int(os.getenv('DB_CONN_MAX_AGE', 60)),
+    CONN_HEALTH_CHECKS=True,
+)
+
+# Read replicas: hosts for PostgreSQL, database files for SQLite.
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1
+):
+    location = 'NAME' if os.getenv('SQLITE_PATH') else 'HOST'
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        location: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.routers.ReplicaRouter']
+
+# Version stamps, membership sets and the token denylist must be seen by
+# every worker process, so the cache is shared through files by default.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+        # Culled version stamps come back from the clock, so culling costs
+        # cache misses only; every set lists the directory, keep it bounded.
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 20000)),
+        },
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -139,6 +191,18 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': PAGE_STEP,
 }
 
+# Bearer tokens are checked first, existing Token keys keep working.
+if JWT_AUTH:
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].insert(
+        0, 'api.authentication.StatelessJWTAuthentication'
+    )
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -169,4 +233,26 @@ FOOT_FONT = 16
 FOOT_RIGHT = 300
 FOOT_UP = 30
 HEIGHT_CROP = 30
+HEIGHT_BOTTOM = 60
 FONT_COLOR = 0.25
+FONT_NAME = 'verdana'
+FONT_PATH = os.path.join(BASE_DIR, 'fonts', 'Verdana.ttf')
+COUNTER_CHUNK_SIZE = 1000
+MEMBERSHIP_CACHE_TTL = 300
+CATALOG_CACHE_TTL = 60 * 60 * 24
+SHOPPING_CART_CHUNK = 500
+SHOPPING_CART_PDF_TTL = 60 * 60
+IMAGE_VARIANT_WIDTHS = (320, 640)
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_WORKERS = 2
+INGREDIENTS_BATCH_SIZE = 1000
+DATASET_BATCH_SIZE = 2000
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics')
+)
+METRICS_FLUSH_INTERVAL = 1
+REPLICA_STICKY_SECONDS = 10
+REPLICA_HEALTH_INTERVAL = 5
+FEED_LENGTH = 500
+FEED_FANOUT_LIMIT = 1000
+FEED_TRIM_INTERVAL = 50
@@ -0,0 +1,51 @@
+"""
+Gunicorn config for foodgram project.
+
+The app is preloaded and warmed up in the master (see foodgram/wsgi.py),
+so workers fork with imports, catalogs, the ingredient index and the PDF
+font already loaded and share them copy-on-write. Workers are recycled
+after a number of requests or once they grow past a memory limit; their
+replacements fork from the same warm master.
+"""
+
+import gc
+import os
+
+bind = f'0.0.0.0:{os.getenv("NGINX_PORT", "8000")}'
+workers = int(os.getenv('GUNICORN_WORKERS', 2 * os.cpu_count() + 1))
+preload_app = (os.getenv('GUNICORN_PRELOAD', 'True') == 'True')
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+MAX_WORKER_RSS = int(os.getenv('GUNICORN_MAX_RSS_MB', 300)) * 1024 * 1024
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def resident_memory():
+    """Resident set size of this process in bytes, None off Linux."""
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return None
+
+
+def when_ready(server):
+    # Objects of the preloaded app live as long as the master, keeping
+    # them out of collections keeps their pages shared with the workers.
+    gc.freeze()
+
+
+def post_request(worker, req, environ, resp):
+    rss = resident_memory()
+    if rss is not None and rss > MAX_WORKER_RSS:
+        worker.log.info(
+            'Worker %s uses %d MB, restarting.', worker.pid, rss >> 20
+        )
+        worker.alive = False
@@ -33,9 +33,10 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = EMPTY_VALUE
 
     def get_favorite_count(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
     get_favorite_count.short_description = 'Add to favorite'
+    get_favorite_count.admin_order_field = 'favorites_count'
 
 
 @admin.register(Ingredient)
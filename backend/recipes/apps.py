@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from .counters import connect_counters
+        from .feed import connect_feeds
+        from .search import connect_search_index
+        connect_counters()
+        connect_feeds()
+        connect_search_index()
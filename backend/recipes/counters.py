@@ -0,0 +1,72 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from users.models import User
+
+from .models import FavoriteRecipe, Follow, Recipe, ShoppingCart
+
+COUNTERS = (
+    (Recipe, User, 'author', 'recipes_count'),
+    (Follow, User, 'author', 'followers_count'),
+    (FavoriteRecipe, Recipe, 'recipe', 'favorites_count'),
+    (ShoppingCart, Recipe, 'recipe', 'in_carts_count'),
+)
+
+
+def change_counter(target, pk, counter, delta):
+    """Change counter column in place with a single UPDATE."""
+
+    queryset = target.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{counter}__gte': -delta})
+    queryset.update(**{counter: F(counter) + delta})
+
+
+def apply_counters(sender, delta, **values):
+    """Change counters behind rows written bypassing model signals."""
+
+    for model, target, field, counter in COUNTERS:
+        if model is sender:
+            change_counter(target, values[f'{field}_id'], counter, delta)
+
+
+def actual_counts(target):
+    """Subquery expressions counting rows behind each target counter."""
+
+    return {
+        counter: Coalesce(
+            Subquery(
+                sender.objects.filter(
+                    **{field: OuterRef('pk')}
+                ).order_by().values(field).annotate(
+                    total=Count('pk')
+                ).values('total')
+            ),
+            Value(0)
+        )
+        for sender, model, field, counter in COUNTERS
+        if model is target
+    }
+
+
+def connect_counter(sender, target, field, counter):
+    """Keep target counter in step with sender rows."""
+
+    def increment(instance, created, **kwargs):
+        if created:
+            change_counter(
+                target, getattr(instance, f'{field}_id'), counter, 1
+            )
+
+    def decrement(instance, **kwargs):
+        change_counter(target, getattr(instance, f'{field}_id'), counter, -1)
+
+    post_save.connect(increment, sender=sender, weak=False)
+    post_delete.connect(decrement, sender=sender, weak=False)
+
+
+def connect_counters():
+    """Connect counter signal handlers."""
+
+    for sender, target, field, counter in COUNTERS:
+        connect_counter(sender, target, field, counter)
@@ -0,0 +1,181 @@
+from api.cache import bump_table_version
+from django.db import connections, router, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Mod, RowNumber
+from django.db.models.signals import post_delete, post_save
+from foodgram.settings import (FEED_FANOUT_LIMIT, FEED_LENGTH,
+                               FEED_TRIM_INTERVAL)
+from users.models import User
+
+from .models import FeedEntry, Follow, Recipe
+
+
+def newest_recipes(queryset, limit=FEED_LENGTH):
+    return queryset.order_by('-pub_date', '-id').values_list(
+        'id', 'pub_date'
+    )[:limit]
+
+
+def insert_entries(select, params):
+    """Insert the feed entries the SELECT returns, skipping existing ones.
+
+    A single INSERT ... SELECT ... ON CONFLICT DO NOTHING, so no row goes
+    through Python however many followers or recipes there are. Names
+    like ``{follow_user}`` in the SELECT become quoted columns, names
+    like ``{follow}`` quoted tables. Returns the number of new entries.
+    No model signals are sent, none are connected for FeedEntry.
+    """
+
+    connection = connections[router.db_for_write(FeedEntry)]
+    quote = connection.ops.quote_name
+    names = {}
+    for model in (FeedEntry, Follow, Recipe, User):
+        table = quote(model._meta.db_table)
+        names[model._meta.model_name] = table
+        for field in model._meta.concrete_fields:
+            names[f'{model._meta.model_name}_{field.name}'] = (
+                f'{table}.{quote(field.column)}'
+            )
+    columns = ', '.join(
+        quote(FeedEntry._meta.get_field(name).column)
+        for name in ('user', 'recipe', 'pub_date')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {names["feedentry"]} ({columns}) '
+            f'{select.format(**names)} '
+            'ON CONFLICT DO NOTHING',
+            params
+        )
+        return cursor.rowcount
+
+
+def trim_feeds(user_ids):
+    """Drop entries past the newest FEED_LENGTH of every user."""
+
+    stale = FeedEntry.objects.filter(user_id__in=user_ids).annotate(
+        rank=Window(
+            RowNumber(),
+            partition_by=F('user_id'),
+            order_by=(F('pub_date').desc(), F('recipe_id').desc())
+        )
+    ).filter(rank__gt=FEED_LENGTH).values('id')
+    FeedEntry.objects.filter(id__in=stale).delete()
+
+
+def fan_out(recipe_id):
+    """Push a new recipe to the feeds of the followers of its author.
+
+    Every follower gets trimmed about once per ``FEED_TRIM_INTERVAL``
+    pushed recipes, which keeps the cost of trimming off most writes.
+    """
+
+    if insert_entries(
+        'SELECT {follow_user}, {recipe_id}, {recipe_pub_date} '
+        'FROM {follow} '
+        'JOIN {recipe} ON {recipe_author} = {follow_author} '
+        'JOIN {user} ON {user_id} = {recipe_author} '
+        'WHERE {recipe_id} = %s AND {user_followers_count} <= %s',
+        [recipe_id, FEED_FANOUT_LIMIT]
+    ):
+        trim_feeds(Follow.objects.alias(
+            slot=Mod(F('user_id') + recipe_id, FEED_TRIM_INTERVAL)
+        ).filter(author__recipes=recipe_id, slot=0).values('user_id'))
+        bump_table_version('recipes')
+
+
+def follow(user_id, author_id):
+    """Push the newest recipes of a newly followed author to the feed."""
+
+    if insert_entries(
+        'SELECT %s, {recipe_id}, {recipe_pub_date} '
+        'FROM {recipe} '
+        'JOIN {user} ON {user_id} = {recipe_author} '
+        'WHERE {recipe_author} = %s AND {user_followers_count} <= %s '
+        'ORDER BY {recipe_pub_date} DESC, {recipe_id} DESC LIMIT %s',
+        [user_id, author_id, FEED_FANOUT_LIMIT, FEED_LENGTH]
+    ):
+        trim_feeds([user_id])
+        bump_table_version('recipes')
+
+
+def unfollow(user_id, author_id):
+    """Remove recipes of an author no longer followed from the feed."""
+
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+    bump_table_version('recipes')
+
+
+def rebuild_feed(user_id):
+    """Refill the feed of the user from the authors they follow."""
+
+    with transaction.atomic():
+        FeedEntry.objects.filter(user_id=user_id).delete()
+        insert_entries(
+            'SELECT %s, {recipe_id}, {recipe_pub_date} '
+            'FROM {recipe} '
+            'JOIN {follow} ON {follow_author} = {recipe_author} '
+            'JOIN {user} ON {user_id} = {recipe_author} '
+            'WHERE {follow_user} = %s AND {user_followers_count} <= %s '
+            'ORDER BY {recipe_pub_date} DESC, {recipe_id} DESC LIMIT %s',
+            [user_id, user_id, FEED_FANOUT_LIMIT, FEED_LENGTH]
+        )
+
+
+def feed_recipe_ids(user, position=None, limit=FEED_LENGTH):
+    """Ids of the newest feed recipes before the keyset position.
+
+    Entries pushed to the timeline of the user are merged with recipes
+    pulled from followed authors too popular to fan out to. The pushed
+    entries are one range scan of the timeline index of the user.
+    """
+
+    pushed = FeedEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(author__in=Follow.objects.filter(
+        user=user, author__followers_count__gt=FEED_FANOUT_LIMIT
+    ).values('author'))
+    if position is not None:
+        pub_date, recipe_id = position
+        pushed = pushed.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+        )
+        pulled = pulled.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=recipe_id)
+        )
+    rows = {
+        (pub_date, recipe_id) for pub_date, recipe_id
+        in pushed.order_by('-pub_date', '-recipe_id').values_list(
+            'pub_date', 'recipe_id'
+        )[:limit]
+    }
+    rows.update(
+        (pub_date, recipe_id) for recipe_id, pub_date
+        in newest_recipes(pulled, limit)
+    )
+    return [recipe_id for _, recipe_id in sorted(rows, reverse=True)[:limit]]
+
+
+def connect_feeds():
+    """Update feeds once new recipes and follows are committed."""
+
+    def on_recipe_save(instance, created, **kwargs):
+        if created:
+            transaction.on_commit(lambda: fan_out(instance.pk))
+
+    def on_follow_save(instance, created, **kwargs):
+        if created:
+            transaction.on_commit(
+                lambda: follow(instance.user_id, instance.author_id)
+            )
+
+    def on_follow_delete(instance, **kwargs):
+        transaction.on_commit(
+            lambda: unfollow(instance.user_id, instance.author_id)
+        )
+
+    post_save.connect(on_recipe_save, sender=Recipe, weak=False)
+    post_save.connect(on_follow_save, sender=Follow, weak=False)
+    post_delete.connect(on_follow_delete, sender=Follow, weak=False)
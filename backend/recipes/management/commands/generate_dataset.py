@@ -0,0 +1,280 @@
+import io
+import random
+import time
+from array import array
+from itertools import accumulate, islice
+
+from api.cache import bump_table_version
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from foodgram.settings import DATASET_BATCH_SIZE
+from PIL import Image
+from recipes.models import (FavoriteRecipe, Follow, Ingredient, Recipe,
+                            RecipeIngredient, RecipeSearchToken, ShoppingCart,
+                            Tag)
+from recipes.search import recipe_tokens
+from users.models import User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+DISHES = (
+    'суп', 'салат', 'пирог', 'рагу', 'каша', 'запеканка', 'омлет', 'паста',
+)
+WORDS = (
+    'нарезать', 'смешать', 'обжарить', 'варить', 'запекать', 'посолить',
+    'поперчить', 'подавать', 'горячим', 'холодным', 'минут', 'до',
+    'готовности', 'на', 'среднем', 'огне', 'добавить', 'перемешать',
+)
+PASSWORD = 'synthetic-password'
+
+
+def power_law(size, skew):
+    """Cumulative weights of ranks 1..size falling as rank ** -skew."""
+
+    return list(accumulate((rank ** -skew for rank in range(1, size + 1))))
+
+
+def degree(rng, average, limit):
+    """Exponentially distributed number of links, at most the limit."""
+
+    if average <= 0:
+        return 0
+    return min(int(rng.expovariate(1 / average)), limit)
+
+
+def placeholder_image():
+    """Name of a stored image shared by every generated recipe."""
+
+    content = io.BytesIO()
+    Image.new('RGB', (64, 64), (226, 108, 45)).save(content, 'PNG')
+    return Recipe._meta.get_field('image').storage.save(
+        'recipes/images/synthetic.png', ContentFile(content.getvalue())
+    )
+
+
+class Command(BaseCommand):
+    """Generate a synthetic dataset."""
+
+    help = (
+        'Generate a deterministic dataset of users, recipes, follows, '
+        'favorites and shopping carts for performance testing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Number of users.'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Number of recipes.'
+        )
+        parser.add_argument(
+            '--min-ingredients', type=int, default=3,
+            help='Minimal number of ingredients per recipe.'
+        )
+        parser.add_argument(
+            '--max-ingredients', type=int, default=12,
+            help='Maximal number of ingredients per recipe.'
+        )
+        parser.add_argument(
+            '--max-tags', type=int, default=2,
+            help='Maximal number of tags per recipe.'
+        )
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='Average number of authors a user follows.'
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=30,
+            help='Average number of favorite recipes per user.'
+        )
+        parser.add_argument(
+            '--carts', type=float, default=5,
+            help='Average number of recipes in a shopping cart.'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Power law exponent of author and recipe popularity.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed; the same seed gives the same dataset.'
+        )
+        parser.add_argument(
+            '--prefix', default='synthetic',
+            help='Username prefix of generated users.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DATASET_BATCH_SIZE,
+            help='Rows inserted per statement.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        if not 1 <= options['min_ingredients'] <= options['max_ingredients']:
+            raise CommandError('Ingredient range must be positive.')
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('At least two users and one recipe needed.')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f'Users "{prefix}-*" already exist, choose another --prefix.'
+            )
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', stdout=self.stdout)
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        self.ingredients = list(
+            Ingredient.objects.order_by('id').values_list('id', 'name')
+        )
+        self.tag_ids = list(Tag.objects.order_by('id').values_list(
+            'id', flat=True
+        ))
+        started = time.perf_counter()
+        self.user_ids = self.insert(User, self.users(), ids=True)
+        self.recipe_ids = self.insert(Recipe, self.recipes(), ids=True)
+        self.insert(RecipeIngredient, self.recipe_ingredients())
+        self.insert(Recipe.tags.through, self.recipe_tags())
+        self.insert(Follow, self.links(
+            Follow, 'author_id', self.user_ids, options['follows']
+        ))
+        self.insert(FavoriteRecipe, self.links(
+            FavoriteRecipe, 'recipe_id', self.recipe_ids,
+            options['favorites']
+        ))
+        self.insert(ShoppingCart, self.links(
+            ShoppingCart, 'recipe_id', self.recipe_ids, options['carts']
+        ))
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_feeds', stdout=self.stdout)
+        bump_table_version('tags', 'ingredients', 'recipes')
+        self.stdout.write(
+            f'Done in {time.perf_counter() - started:.2f} s.'
+        )
+
+    def insert(self, model, rows, ids=False):
+        """Insert rows in batches, return primary keys of the new rows."""
+
+        started = time.perf_counter()
+        last = model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        total = 0
+        with transaction.atomic():
+            while True:
+                batch = list(islice(rows, self.options['batch_size']))
+                if not batch:
+                    break
+                model.objects.bulk_create(batch)
+                total += len(batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: {total} rows in '
+            f'{elapsed:.2f} s ({total / max(elapsed, 1e-9):.0f} rows/s).'
+        )
+        if not ids:
+            return None
+        return array('q', model.objects.filter(pk__gt=last).order_by(
+            'pk'
+        ).values_list('pk', flat=True).iterator())
+
+    def users(self):
+        password = make_password(PASSWORD)
+        prefix = self.options['prefix']
+        for number in range(self.options['users']):
+            username = f'{prefix}-{number}'
+            yield User(
+                username=username,
+                email=f'{username}@example.com',
+                first_name=f'Name{number}',
+                last_name=f'Surname{number}',
+                password=password,
+            )
+
+    def recipes(self):
+        image = placeholder_image()
+        authors = power_law(len(self.user_ids), self.options['skew'])
+        for author_id in self.rng.choices(
+            self.user_ids, cum_weights=authors, k=self.options['recipes']
+        ):
+            ingredient_name = self.rng.choice(self.ingredients)[1]
+            yield Recipe(
+                author_id=author_id,
+                name=f'{ingredient_name} {self.rng.choice(DISHES)}'[:200],
+                text=' '.join(self.rng.choices(WORDS, k=20)),
+                image=image,
+                cooking_time=self.rng.randint(1, 180),
+            )
+
+    def recipe_ingredients(self):
+        """Ingredient rows of the recipes, indexing them for search."""
+
+        tokens = []
+        for recipe_id, name, text in self.new_recipes():
+            ingredients = self.rng.sample(self.ingredients, self.rng.randint(
+                self.options['min_ingredients'],
+                min(self.options['max_ingredients'], len(self.ingredients))
+            ))
+            for ingredient_id, ingredient_name in ingredients:
+                yield RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                )
+            tokens.extend(
+                RecipeSearchToken(
+                    recipe_id=recipe_id, token=token, weight=weight
+                )
+                for token, weight in recipe_tokens(
+                    name, text,
+                    [ingredient_name for _, ingredient_name in ingredients]
+                ).items()
+            )
+            if len(tokens) >= self.options['batch_size']:
+                RecipeSearchToken.objects.bulk_create(tokens)
+                tokens = []
+        RecipeSearchToken.objects.bulk_create(tokens)
+
+    def new_recipes(self):
+        """Names and texts of the new recipes, read a batch at a time."""
+
+        size = self.options['batch_size']
+        for start in range(0, len(self.recipe_ids), size):
+            chunk = self.recipe_ids[start:start + size]
+            yield from Recipe.objects.filter(
+                pk__gte=chunk[0], pk__lte=chunk[-1]
+            ).order_by('pk').values_list('pk', 'name', 'text')
+
+    def recipe_tags(self):
+        through = Recipe.tags.through
+        for recipe_id in self.recipe_ids:
+            for tag_id in self.rng.sample(self.tag_ids, self.rng.randint(
+                1, min(self.options['max_tags'], len(self.tag_ids))
+            )):
+                yield through(recipe_id=recipe_id, tag_id=tag_id)
+
+    def links(self, model, field, targets, average):
+        """Links of every user to distinct targets picked by popularity."""
+
+        weights = power_law(len(targets), self.options['skew'])
+        for user_id in self.user_ids:
+            chosen = set()
+            wanted = degree(self.rng, average, (len(targets) - 1) // 2)
+            while len(chosen) < wanted:
+                for target in self.rng.choices(
+                    targets, cum_weights=weights, k=wanted - len(chosen)
+                ):
+                    if target != user_id or field != 'author_id':
+                        chosen.add(target)
+            for target in sorted(chosen):
+                yield model(user_id=user_id, **{field: target})
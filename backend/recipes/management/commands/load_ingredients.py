@@ -1,26 +1,126 @@
 import csv
+import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
-from foodgram.settings import POS_ONE, POS_ZERO
+from api.cache import bump_table_version
+from django.core.management.base import BaseCommand, CommandError
+from foodgram.settings import INGREDIENTS_BATCH_SIZE, POS_ONE, POS_ZERO
 from recipes.models import Ingredient
 
+DEFAULT_PATH = './data/ingredients.csv'
+READ_CHUNK = 64 * 1024
+
+
+def read_csv(file):
+    """Ingredient rows of a csv file."""
+
+    for row in csv.reader(file, delimiter=','):
+        try:
+            yield row[POS_ZERO], row[POS_ONE]
+        except IndexError:
+            yield None
+
+
+def read_json(file):
+    """Ingredient rows of a json array, decoded one object at a time."""
+
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_CHUNK).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Json source must be an array of ingredients.')
+    position = 1
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK)
+            if not chunk:
+                raise CommandError('Json source is truncated.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        try:
+            yield item['name'], item['measurement_unit']
+        except (KeyError, TypeError):
+            yield None
+
 
 class Command(BaseCommand):
     """Load ingredients to the database."""
 
-    help = 'Load ingredients in the database from csv.'
+    help = 'Load ingredients in the database from csv or json.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Path to ingredients.csv or ingredients.json.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=INGREDIENTS_BATCH_SIZE,
+            help='Rows inserted per statement.'
+        )
 
     def handle(self, *args, **options):
-        with open('./data/ingredients.csv', 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            ingredients = []
-            for row in csv_reader:
-                try:
-                    create_ingredients = Ingredient(
-                        name=row[POS_ZERO],
-                        measurement_unit=row[POS_ONE],
-                    )
-                    ingredients.append(create_ingredients)
-                except ValueError:
-                    print('Data discrepancy ignored.')
-            Ingredient.objects.bulk_create(ingredients)
+        path = options['path']
+        extension = os.path.splitext(path)[1].lower()
+        readers = {'.csv': read_csv, '.json': read_json}
+        if extension not in readers:
+            raise CommandError('Source must be a .csv or .json file.')
+        self.max_length = Ingredient._meta.get_field('name').max_length
+        self.created = self.skipped = self.invalid = 0
+        started = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as source:
+            rows = readers[extension](source)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.load_batch(batch)
+        elapsed = time.perf_counter() - started
+        total = self.created + self.skipped + self.invalid
+        self.stdout.write(
+            f'{total} rows in {elapsed:.2f} s '
+            f'({total / max(elapsed, 1e-9):.0f} rows/s): '
+            f'{self.created} new, {self.skipped} skipped, '
+            f'{self.invalid} invalid.'
+        )
+        bump_table_version('ingredients', 'recipes')
+
+    def clean(self, row):
+        if row is None:
+            return None
+        name, measurement_unit = (str(value).strip() for value in row)
+        if not name or not measurement_unit or max(
+            len(name), len(measurement_unit)
+        ) > self.max_length:
+            return None
+        return name, measurement_unit
+
+    def load_batch(self, batch):
+        rows = {}
+        for row in map(self.clean, batch):
+            if row is None:
+                self.invalid += 1
+            elif row in rows:
+                self.skipped += 1
+            else:
+                rows[row] = None
+        existing = set(
+            Ingredient.objects.filter(
+                name__in={name for name, measurement_unit in rows}
+            ).values_list('name', 'measurement_unit')
+        )
+        new = [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in rows
+            if (name, measurement_unit) not in existing
+        ]
+        Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+        self.created += len(new)
+        self.skipped += len(rows) - len(new)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import rebuild_feed
+from recipes.models import Follow
+
+
+class Command(BaseCommand):
+    """Rebuild feed timelines."""
+
+    help = (
+        'Refill the feed timeline of every user following someone from '
+        'the newest recipes of the authors they follow.'
+    )
+
+    def handle(self, *args, **options):
+        user_ids = list(Follow.objects.values_list(
+            'user_id', flat=True
+        ).distinct().order_by('user_id'))
+        for user_id in user_ids:
+            rebuild_feed(user_id)
+        self.stdout.write(f'Feeds: {len(user_ids)} rebuilt.')
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, Q
+from foodgram.settings import COUNTER_CHUNK_SIZE
+from recipes.counters import actual_counts
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Recompute denormalized counters."""
+
+    help = 'Recompute and repair recipe and user counters in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=COUNTER_CHUNK_SIZE,
+            help='Number of primary keys processed per UPDATE.'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        for model in (User, Recipe):
+            repaired = self.repair(model, chunk_size)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {repaired} repaired.'
+            )
+
+    def repair(self, model, chunk_size):
+        counts = actual_counts(model)
+        aliases = {f'actual_{name}': value for name, value in counts.items()}
+        stale = Q()
+        for name in counts:
+            stale |= ~Q(**{name: F(f'actual_{name}')})
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        repaired = 0
+        for start in range(0, last + 1, chunk_size):
+            with transaction.atomic():
+                repaired += model.objects.filter(
+                    pk__gte=start, pk__lt=start + chunk_size
+                ).alias(**aliases).filter(stale).update(**counts)
+        return repaired
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.CheckConstraint(check=models.Q(('amount__gt', 0)), name='recipe_ingredient_amount_positive'),
+        ),
+    ]
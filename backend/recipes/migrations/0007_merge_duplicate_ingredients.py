@@ -0,0 +1,39 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:51
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    groups = Ingredient.objects.values('name', 'measurement_unit').annotate(
+        kept=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for group in groups:
+        duplicates = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['kept'])
+        for row in RecipeIngredient.objects.filter(ingredient__in=duplicates):
+            kept = RecipeIngredient.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=group['kept']
+            ).first()
+            if kept is None:
+                row.ingredient_id = group['kept']
+                row.save(update_fields=('ingredient',))
+            else:
+                kept.amount += row.amount
+                kept.save(update_fields=('amount',))
+                row.delete()
+        duplicates.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:53
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+TOKEN_LENGTH = 64
+MIN_TOKEN_LENGTH = 2
+NAME_WEIGHT = 4
+INGREDIENT_WEIGHT = 2
+TEXT_WEIGHT = 1
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    text = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+    return {
+        word[:TOKEN_LENGTH] for word in WORD.findall(text)
+        if len(word) >= MIN_TOKEN_LENGTH
+    }
+
+
+def recipe_tokens(name, text, ingredient_names):
+    weights = {}
+    fields = (
+        (name, NAME_WEIGHT),
+        (text, TEXT_WEIGHT),
+        (' '.join(ingredient_names), INGREDIENT_WEIGHT),
+    )
+    for value, weight in fields:
+        for token in tokenize(value):
+            weights[token] = weights.get(token, 0) + weight
+    return weights
+
+
+def index_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeSearchToken = apps.get_model('recipes', 'RecipeSearchToken')
+    for recipe in Recipe.objects.prefetch_related('ingredients').iterator(
+        chunk_size=500
+    ):
+        weights = recipe_tokens(
+            recipe.name, recipe.text,
+            [ingredient.name for ingredient in recipe.ingredients.all()]
+        )
+        RecipeSearchToken.objects.bulk_create(
+            RecipeSearchToken(recipe=recipe, token=token, weight=weight)
+            for token, weight in weights.items()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_unique_ingredient_unit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, verbose_name='Token')),
+                ('weight', models.PositiveIntegerField(verbose_name='Weight')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='recipes.recipe', verbose_name='Recipe')),
+            ],
+            options={
+                'verbose_name': 'Search token',
+                'verbose_name_plural': 'Search tokens',
+                'ordering': ('token',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipesearchtoken',
+            constraint=models.UniqueConstraint(fields=('token', 'recipe'), name='unique_search_token'),
+        ),
+        migrations.RunPython(index_recipes, migrations.RunPython.noop),
+    ]
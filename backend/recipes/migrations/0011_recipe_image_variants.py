@@ -0,0 +1,46 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:42
+
+import os
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+VARIANT_WIDTHS = (320, 640)
+VARIANT_FORMATS = ('webp', 'jpeg')
+
+
+def record_variants(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    names = Recipe.objects.exclude(image='').values_list(
+        'image', flat=True
+    ).distinct()
+    for name in names.iterator():
+        stem = os.path.splitext(os.path.basename(name))[0]
+        variants = {}
+        for image_format in VARIANT_FORMATS:
+            widths = [
+                width for width in VARIANT_WIDTHS
+                if default_storage.exists(
+                    f'recipes/variants/{stem}-{width}.{image_format}'
+                )
+            ]
+            if widths:
+                variants[image_format] = widths
+        if variants:
+            Recipe.objects.filter(image=name).update(image_variants=variants)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Resized image variants'),
+        ),
+        migrations.RunPython(record_variants, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.core.validators import MinValueValidator
 from django.db import models
-from users.models import User
+from users.models import CountersMixin, User
+
+from .storage import ContentAddressedStorage
 
 TEXT_LENGTH = 29
 
@@ -41,12 +43,18 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Ingredient'
         verbose_name_plural = 'Ingredients'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit',),
+                name='unique_ingredient_unit',
+            ),
+        ]
 
     def __str__(self):
         return self.name[:TEXT_LENGTH]
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Recipe model."""
 
     name = models.CharField(
@@ -61,8 +69,14 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images',
+        storage=ContentAddressedStorage(),
         verbose_name='Recipe image'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Resized image variants'
+    )
     text = models.TextField(
         verbose_name='Recipe text'
     )
@@ -90,15 +104,50 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Publication date'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Added to favorites'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Added to shopping carts'
+    )
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id',),
+                name='recipe_pub_date_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name[:TEXT_LENGTH]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.stored_image = instance.__dict__.get('image')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save the recipe, forgetting the variants of a replaced image."""
+
+        if 'image' in self.__dict__ and (
+            self.image.name != getattr(self, 'stored_image', None)
+        ):
+            self.image_variants = {}
+        super().save(*args, **kwargs)
+        if 'image' in self.__dict__:
+            self.stored_image = self.image.name
+
 
 class RecipeIngredient(models.Model):
     """Recipe ingredient model."""
@@ -134,6 +183,10 @@ class RecipeIngredient(models.Model):
                 fields=('recipe', 'ingredient',),
                 name='unique_ingredient',
             ),
+            models.CheckConstraint(
+                check=models.Q(amount__gt=0),
+                name='recipe_ingredient_amount_positive',
+            ),
         ]
 
     def __str__(self):
@@ -222,3 +275,76 @@ class ShoppingCart(models.Model):
                 name='unique_shoppingcart',
             ),
         ]
+
+
+class RecipeSearchToken(models.Model):
+    """Recipe search token model."""
+
+    token = models.CharField(
+        max_length=64,
+        verbose_name='Token'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='search_tokens',
+        verbose_name='Recipe'
+    )
+    weight = models.PositiveIntegerField(
+        verbose_name='Weight'
+    )
+
+    class Meta:
+        ordering = ('token',)
+        verbose_name = 'Search token'
+        verbose_name_plural = 'Search tokens'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('token', 'recipe',),
+                name='unique_search_token',
+            ),
+        ]
+
+    def __str__(self):
+        return self.token
+
+
+class FeedEntry(models.Model):
+    """Recipe pushed to the feed of a follower of its author."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        db_index=False,
+        verbose_name='Follower'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Recipe'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Publication date'
+    )
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe')
+        verbose_name = 'Feed entry'
+        verbose_name_plural = 'Feed entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe',),
+                name='unique_feed_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe',),
+                name='feed_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.recipe_id}'
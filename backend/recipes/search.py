@@ -0,0 +1,134 @@
+import re
+import threading
+import unicodedata
+
+from api.cache import bump_table_version
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.signals import post_delete, post_save
+
+from .models import Ingredient, Recipe, RecipeIngredient, RecipeSearchToken
+
+TOKEN_LENGTH = 64
+MIN_TOKEN_LENGTH = 2
+NAME_WEIGHT = 4
+INGREDIENT_WEIGHT = 2
+TEXT_WEIGHT = 1
+WORD = re.compile(r'\w+')
+
+pending = threading.local()
+
+
+def normalize(text):
+    """Casefold text so that Cyrillic and Latin match case-insensitively."""
+
+    return unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+
+
+def tokenize(text):
+    """Distinct normalized words of the text."""
+
+    return {
+        word[:TOKEN_LENGTH] for word in WORD.findall(normalize(text))
+        if len(word) >= MIN_TOKEN_LENGTH
+    }
+
+
+def recipe_tokens(name, text, ingredient_names):
+    """Search tokens of the recipe with field-weighted scores."""
+
+    weights = {}
+    fields = (
+        (name, NAME_WEIGHT),
+        (text, TEXT_WEIGHT),
+        (' '.join(ingredient_names), INGREDIENT_WEIGHT),
+    )
+    for value, weight in fields:
+        for token in tokenize(value):
+            weights[token] = weights.get(token, 0) + weight
+    return weights
+
+
+def index_recipe(recipe_id):
+    """Replace search tokens of the recipe."""
+
+    recipe = Recipe.objects.filter(pk=recipe_id).values('name', 'text').first()
+    if recipe is None:
+        return
+    ingredient_names = Ingredient.objects.filter(
+        ingredient__recipe_id=recipe_id
+    ).values_list('name', flat=True)
+    weights = recipe_tokens(recipe['name'], recipe['text'], ingredient_names)
+    with transaction.atomic():
+        RecipeSearchToken.objects.filter(recipe_id=recipe_id).delete()
+        RecipeSearchToken.objects.bulk_create(
+            RecipeSearchToken(recipe_id=recipe_id, token=token, weight=weight)
+            for token, weight in weights.items()
+        )
+
+
+def search_recipes(queryset, query):
+    """Recipes holding every token of the query, most relevant first."""
+
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+    matches = RecipeSearchToken.objects.filter(
+        token__in=tokens
+    ).order_by().values('recipe').annotate(
+        rank=Sum('weight'), hits=Count('id')
+    ).filter(hits=len(tokens))
+    return queryset.filter(
+        id__in=matches.values('recipe')
+    ).annotate(
+        search_rank=Subquery(
+            matches.filter(recipe=OuterRef('pk')).values('rank')
+        )
+    ).order_by('-search_rank', '-pub_date', '-id')
+
+
+def index_pending():
+    """Index every recipe collected for reindexing, each once."""
+
+    if not pending.recipe_ids:
+        return
+    while pending.recipe_ids:
+        index_recipe(pending.recipe_ids.pop())
+    bump_table_version('recipes')
+
+
+def connect_search_index():
+    """Reindex recipes once the transaction touching them commits.
+
+    Recipe ids are collected per thread and indexed by the first commit
+    callback to run, so a recipe written many times in a transaction is
+    indexed once and the callbacks after it find nothing to do.
+    """
+
+    def reindex(recipe_id):
+        if not hasattr(pending, 'recipe_ids'):
+            pending.recipe_ids = set()
+        pending.recipe_ids.add(recipe_id)
+        transaction.on_commit(index_pending)
+
+    def on_recipe_save(instance, **kwargs):
+        reindex(instance.pk)
+
+    def on_recipe_ingredient_change(instance, **kwargs):
+        reindex(instance.recipe_id)
+
+    def on_ingredient_save(instance, created, **kwargs):
+        if not created:
+            for recipe_id in RecipeIngredient.objects.filter(
+                ingredient=instance
+            ).values_list('recipe_id', flat=True):
+                reindex(recipe_id)
+
+    post_save.connect(on_recipe_save, sender=Recipe, weak=False)
+    post_save.connect(
+        on_recipe_ingredient_change, sender=RecipeIngredient, weak=False
+    )
+    post_delete.connect(
+        on_recipe_ingredient_change, sender=RecipeIngredient, weak=False
+    )
+    post_save.connect(on_ingredient_save, sender=Ingredient, weak=False)
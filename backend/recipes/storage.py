@@ -0,0 +1,40 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK = 64 * 1024
+
+
+class ContentName(str):
+    """Storage name derived from the file content."""
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage naming files by the SHA-256 of their content.
+
+    Identical uploads map to the same name and are stored only once.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        if isinstance(name, ContentName):
+            # Taken by the same content meanwhile, stop the retry loop of
+            # FileSystemStorage._save instead of trying the name again.
+            raise FileExistsError(name)
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in iter(lambda: content.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+        content.seek(0)
+        directory, file_name = os.path.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+        name = os.path.join(directory, f'{digest.hexdigest()}{extension}')
+        if self.exists(name):
+            return name
+        try:
+            return super()._save(ContentName(name), content)
+        except FileExistsError:
+            return name
@@ -10,7 +10,10 @@ EMPTY_VALUE = '-empty-'
 class UserAdmin(UserAdmin):
     """User administrator."""
 
-    list_display = ('id', 'username', 'email', 'first_name', 'last_name',)
+    list_display = (
+        'id', 'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'followers_count',
+    )
     list_filter = ('username', 'email',)
     search_fields = ('username', 'email',)
     empty_value_display = EMPTY_VALUE
@@ -4,7 +4,31 @@ from django.db import models
 TEXT_LENGTH = 29
 
 
-class User(AbstractUser):
+class CountersMixin:
+    '''Model with counter columns maintained by in-place UPDATEs.'''
+
+    counter_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        '''Save an existing row without writing its counters back.
+
+        The counters held in memory may be stale by the time the row is
+        saved, writing them would undo the increments made meanwhile.
+        '''
+
+        if update_fields is None and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
+
+class User(CountersMixin, AbstractUser):
     '''Custom user model.'''
 
     username = models.CharField(
@@ -21,6 +45,18 @@ class User(AbstractUser):
     last_name = models.CharField(
         max_length=150,
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Recipes',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Followers',
+    )
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = 'username', 'first_name', 'last_name'
@@ -32,3 +68,30 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username[:TEXT_LENGTH]
+
+    def refresh_from_db(self, using=None, fields=None):
+        '''Load all deferred fields at once when any of them is read.'''
+
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.issuperset(fields):
+            fields = deferred
+        super().refresh_from_db(using, fields)
+
+
+class RevokedToken(models.Model):
+    '''Signed token revoked before it expires.'''
+
+    jti = models.CharField(
+        max_length=255,
+        unique=True,
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Revoked token'
+        verbose_name_plural = 'Revoked tokens'
+
+    def __str__(self):
+        return self.jti